@@ -1,28 +1,172 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import (BooleanField, Case, Count, Exists, F,
+                              IntegerField, OuterRef, Q, Subquery, Value,
+                              When)
+from django.db.models.functions import Coalesce
 from django_filters import rest_framework as filters
 
-from foodgram.models import Recipe, Tag
+from api.reference_data import tag_reference
+from constants import MAX_INGREDIENT_MATCH, SEARCH_CONFIG
+from foodgram.models import AmountIngredients, Favorited, Recipe, ShoppingCart
+
+INGREDIENT_MATCH_CHOICES = (
+    ('all', 'Все ингредиенты'),
+    ('most', 'Больше половины ингредиентов'),
+    ('any', 'Хотя бы один ингредиент'),
+)
+
+
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    pass
+
+
+def ingredient_count(ingredient_ids=None):
+    """Подзапрос: число ингредиентов рецепта (из ingredient_ids)."""
+    items = AmountIngredients.objects.filter(recipe_id=OuterRef('pk'))
+    if ingredient_ids is not None:
+        items = items.filter(ingredient_id__in=ingredient_ids)
+    return Coalesce(Subquery(
+        items.order_by().values('recipe_id')
+        .annotate(total=Count('pk')).values('total'),
+        output_field=IntegerField()
+    ), Value(0))
+
+
+def tag_choices():
+    return [(tag['slug'], tag['name']) for tag in tag_reference.get().items]
 
 
 class RecipeFilter(filters.FilterSet):
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all(),
+    """Фильтры списка рецептов.
+
+    Теги, избранное и корзина проверяются коррелированными EXISTS, а не
+    JOIN + DISTINCT: список остаётся без дублей и может читаться
+    по индексу на pub_date в порядке сортировки.
+    """
+
+    author = filters.NumberFilter(field_name='author_id')
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_choices,
+        method='filter_tags',
         label='Filter by tag slugs'
     )
-
     is_favorited = filters.NumberFilter(
         method='filter_is_favorited',
         label='Filter favorited recipes (1/0)'
     )
+    is_in_shopping_cart = filters.NumberFilter(
+        method='filter_is_in_shopping_cart',
+        label='Filter recipes in shopping cart (1/0)'
+    )
+    search = filters.CharFilter(
+        method='filter_search',
+        label='Full-text search in name and text'
+    )
+    ingredients = NumberInFilter(
+        method='filter_ingredients',
+        label='Ingredient ids, comma separated'
+    )
+    match = filters.ChoiceFilter(
+        choices=INGREDIENT_MATCH_CHOICES,
+        method='filter_match',
+        label='How many of the ingredients must match (all/most/any)'
+    )
 
     class Meta:
         model = Recipe
-        fields = ['author', 'tags', 'is_favorited']
+        fields = [
+            'author', 'tags', 'is_favorited', 'is_in_shopping_cart',
+            'search', 'ingredients', 'match'
+        ]
 
-    def filter_is_favorited(self, queryset, name, value):
+    def filter_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        slugs = set(value)
+        tag_ids = [
+            tag.id for tag in tag_reference.get().by_id.values()
+            if tag.slug in slugs
+        ]
+        return queryset.filter(Exists(
+            Recipe.tags.through.objects.filter(
+                recipe_id=OuterRef('pk'), tag_id__in=tag_ids
+            )
+        ))
+
+    def filter_user_relation(self, queryset, model, value):
+        if not value:
+            return queryset
         user = self.request.user
-        print('adsadad')
-        if value == 1 and user.is_authenticated:
-            return queryset.favorited_by.all()
+        if not user.is_authenticated:
+            return queryset.none()
+        return queryset.filter(Exists(
+            model.objects.filter(user=user, recipe_id=OuterRef('pk'))
+        ))
+
+    def filter_is_favorited(self, queryset, name, value):
+        return self.filter_user_relation(queryset, Favorited, value)
+
+    def filter_is_in_shopping_cart(self, queryset, name, value):
+        return self.filter_user_relation(queryset, ShoppingCart, value)
+
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск: совпадения в названии выше, чем в тексте.
+
+        В PostgreSQL используется хранимый search_vector (GIN-индекс,
+        русская морфология); в других СУБД — icontains.
+        """
+        value = value.strip()
+        if not value:
+            return queryset
+        if connection.vendor != 'postgresql':
+            return queryset.filter(
+                Q(name__icontains=value) | Q(text__icontains=value)
+            ).annotate(name_match=Case(
+                When(name__icontains=value, then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField()
+            )).order_by('-name_match', '-pub_date', '-pk')
+        query = SearchQuery(value, config=SEARCH_CONFIG)
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query)
+        ).order_by('-rank', '-pub_date', '-pk')
+
+    def filter_match(self, queryset, name, value):
+        # Применяется вместе с ingredients в filter_ingredients
         return queryset
+
+    def filter_ingredients(self, queryset, name, value):
+        """Рецепты по набору ингредиентов, по убыванию покрытия.
+
+        Кандидаты выбираются группировкой AmountIngredients по индексу
+        (ingredient, recipe), то есть по спискам рецептов каждого из
+        переданных ингредиентов; рецепты, которые не содержат ни одного
+        из них, не просматриваются.
+        """
+        ingredient_ids = list(dict.fromkeys(
+            int(ingredient_id) for ingredient_id in value
+        ))[:MAX_INGREDIENT_MATCH]
+        if not ingredient_ids:
+            return queryset
+        required = {
+            'all': len(ingredient_ids),
+            'most': len(ingredient_ids) // 2 + 1,
+        }.get(self.form.cleaned_data.get('match'), 1)
+        candidates = (
+            AmountIngredients.objects
+            .filter(ingredient_id__in=ingredient_ids)
+            .order_by()
+            .values('recipe_id')
+            .annotate(matched=Count('pk'))
+            .filter(matched__gte=required)
+            .values('recipe_id')
+        )
+        return queryset.filter(pk__in=candidates).annotate(
+            matched_ingredients=ingredient_count(ingredient_ids),
+            missing_ingredients=(
+                ingredient_count() - F('matched_ingredients')
+            )
+        ).order_by(
+            '-matched_ingredients', 'missing_ingredients', '-pub_date', '-pk'
+        )
@@ -1,9 +1,206 @@
-from rest_framework.pagination import LimitOffsetPagination
+import base64
+import hashlib
+from datetime import datetime
 
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
-class RecipPagination(LimitOffsetPagination):
+from constants import PAGINATION_COUNT_TIMEOUT, PAGINATION_ESTIMATE_THRESHOLD
 
-    efault_limit = 6  # Default limit
-    limit_query_param = 'limit'  # Customize the limit query parameter
-    offset_query_param = 'offset'  # Customize the offset query parameter
-    max_limit = 100
+
+class CachedCountPaginator(Paginator):
+    """Paginator, который не обрезает страницу по устаревшему count."""
+
+    def __init__(self, object_list, per_page, count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count = count
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(
+            self.object_list[bottom:bottom + self.per_page], number, self
+        )
+
+
+class CachedCountMixin:
+    """Кешируемый и приблизительный COUNT для пагинаторов.
+
+    Точный COUNT кешируется на короткое время по SQL запроса без
+    сортировки, то есть по нормализованному набору фильтров. Для
+    запроса без фильтров к большой таблице PostgreSQL используется
+    оценка pg_class.reltuples.
+    """
+
+    count_timeout = PAGINATION_COUNT_TIMEOUT
+    estimate_threshold = PAGINATION_ESTIMATE_THRESHOLD
+
+    def get_count(self, queryset):
+        if not queryset.query.where:
+            estimate = self.get_estimated_count(queryset.model)
+            if estimate >= self.estimate_threshold:
+                return estimate
+        try:
+            sql = str(queryset.order_by().values('pk').query)
+        except EmptyResultSet:
+            return 0
+        key = 'count:' + hashlib.md5(sql.encode()).hexdigest()
+        return cache.get_or_set(key, queryset.count, self.count_timeout)
+
+    def get_estimated_count(self, model):
+        if connection.vendor != 'postgresql':
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE relname = %s',
+                [model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        return int(row[0]) if row else 0
+
+    def django_paginator_class(self, object_list, per_page, **kwargs):
+        """Paginator с уже посчитанным count (для PageNumberPagination)."""
+        return CachedCountPaginator(
+            object_list, per_page, self.get_count(object_list), **kwargs
+        )
+
+
+class RecipeCursorPagination(CachedCountMixin, BasePagination):
+    """Keyset-пагинация по (pub_date, id) от новых к старым.
+
+    Курсор хранит ключ последней (или первой) записи страницы, поэтому
+    глубина страницы не влияет на стоимость запроса. Рецепты без даты
+    публикации сравниваются по pub_key и идут последними.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    page_size = 6
+    max_page_size = 100
+    invalid_cursor_message = 'Некорректный курсор.'
+    ordering_conflict_message = (
+        'Курсор задаёт порядок по дате публикации и не сочетается с '
+        'сортировкой или ранжированием (ordering, search, ingredients).'
+    )
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def encode_cursor(self, obj, reverse):
+        raw = f'{int(reverse)}|{obj.pub_key.isoformat()}|{obj.pk}'
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(token.encode()).decode()
+            reverse, pub_date, pk = raw.split('|')
+            return (
+                bool(int(reverse)), datetime.fromisoformat(pub_date), int(pk)
+            )
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if queryset.query.order_by:
+            # Явный порядок задали фильтры; keyset по дате его бы потерял
+            raise ValidationError({
+                self.cursor_query_param: self.ordering_conflict_message
+            })
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.count = self.get_count(queryset)
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor[0]
+        queryset = queryset.with_pub_key()
+        if cursor is not None:
+            _, pub_key, pk = cursor
+            if reverse:
+                queryset = queryset.filter(
+                    Q(pub_key__gt=pub_key) | Q(pub_key=pub_key, pk__gt=pk)
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(pub_key__lt=pub_key) | Q(pub_key=pub_key, pk__lt=pk)
+                )
+        ordering = ('pub_key', 'pk') if reverse else ('-pub_key', '-pk')
+        page = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(page) > self.page_size
+        page = page[:self.page_size]
+        if reverse:
+            page.reverse()
+            self.has_next, self.has_previous = bool(page), has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        self.page = page
+        return page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.base_url, self.cursor_query_param,
+            self.encode_cursor(self.page[-1], reverse=False)
+        )
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return replace_query_param(
+                self.base_url, self.cursor_query_param, ''
+            )
+        return replace_query_param(
+            self.base_url, self.cursor_query_param,
+            self.encode_cursor(self.page[0], reverse=True)
+        )
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data
+        })
+
+
+class RecipPagination(CachedCountMixin, PageNumberPagination):
+    """Постраничный вывод рецептов (?page=, ?limit=).
+
+    С параметром ?cursor= (в том числе пустым) включается keyset-режим
+    RecipeCursorPagination с тем же форматом ответа.
+    """
+
+    page_size = 6
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    cursor_pagination_class = RecipeCursorPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        cursor_query_param = self.cursor_pagination_class.cursor_query_param
+        if cursor_query_param in request.query_params:
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
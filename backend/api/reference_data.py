@@ -0,0 +1,135 @@
+import threading
+import uuid
+from bisect import bisect_left
+from itertools import islice
+from types import SimpleNamespace
+
+from django.core.cache import caches
+from django.db import transaction
+
+from constants import VERSIONS_CACHE
+from foodgram.models import Ingredient, Tag
+
+
+class IngredientIndex:
+    """Отсортированный по названию индекс ингредиентов.
+
+    Совпадения по началу названия ищутся бинарным поиском, затем
+    список добирается совпадениями по подстроке.
+    """
+
+    def __init__(self, items):
+        self.rows = sorted(
+            ((item['name'].lower(), item) for item in items),
+            key=lambda row: row[0]
+        )
+        self.keys = [key for key, _ in self.rows]
+
+    def search(self, query, limit):
+        query = query.lower()
+        start = bisect_left(self.keys, query)
+        result = []
+        for key, item in islice(self.rows, start, None):
+            if len(result) >= limit or not key.startswith(query):
+                break
+            result.append(item)
+        for key, item in self.rows:
+            if len(result) >= limit:
+                break
+            if query in key and not key.startswith(query):
+                result.append(item)
+        return result
+
+
+class ReferenceData:
+    """Снимок справочника в памяти процесса.
+
+    Снимок не меняется после построения и перестраивается, когда
+    сигналы моделей меняют его версию в кеше версий.
+    """
+
+    model = None
+    fields = ()
+
+    def __init__(self, version_key):
+        self.version_key = version_key
+        self.snapshot = None
+        self.lock = threading.Lock()
+
+    def __deepcopy__(self, memo):
+        # Поля сериализаторов копируются при каждом создании сериализатора
+        return self
+
+    def get_version(self):
+        # Случайная метка, а не счётчик: даже потерянная версия не
+        # совпадёт ни с одним старым снимком или ETag
+        return caches[VERSIONS_CACHE].get_or_set(
+            self.version_key, self.new_version, timeout=None
+        )
+
+    @staticmethod
+    def new_version():
+        return uuid.uuid4().hex
+
+    def invalidate(self):
+        """Сменить версию после коммита текущей транзакции.
+
+        Иначе запрос между сменой версии и коммитом построил бы снимок
+        из старых строк под новой версией.
+        """
+        transaction.on_commit(self.bump_version)
+
+    def bump_version(self):
+        caches[VERSIONS_CACHE].set(
+            self.version_key, self.new_version(), timeout=None
+        )
+
+    def build(self, version):
+        objects = list(self.model.objects.all())
+        return SimpleNamespace(
+            version=version,
+            etag=f'"{self.version_key}-{version}"',
+            items=tuple(
+                {field: getattr(obj, field) for field in self.fields}
+                for obj in objects
+            ),
+            by_id={obj.pk: obj for obj in objects}
+        )
+
+    def get(self):
+        version = self.get_version()
+        snapshot = self.snapshot
+        if snapshot is None or snapshot.version != version:
+            with self.lock:
+                snapshot = self.snapshot
+                if snapshot is None or snapshot.version != version:
+                    snapshot = self.snapshot = self.build(version)
+        return snapshot
+
+    def resolve(self, ids):
+        """Объекты по id: из снимка, недостающие одним in_bulk."""
+        by_id = self.get().by_id
+        found = {pk: by_id[pk] for pk in ids if pk in by_id}
+        missing = set(ids) - found.keys()
+        if missing:
+            found.update(self.model.objects.in_bulk(missing))
+        return found
+
+
+class TagReferenceData(ReferenceData):
+    model = Tag
+    fields = ('id', 'name', 'slug')
+
+
+class IngredientReferenceData(ReferenceData):
+    model = Ingredient
+    fields = ('id', 'name', 'measurement_unit')
+
+    def build(self, version):
+        snapshot = super().build(version)
+        snapshot.index = IngredientIndex(snapshot.items)
+        return snapshot
+
+
+tag_reference = TagReferenceData('tags_version')
+ingredient_reference = IngredientReferenceData('ingredients_version')
@@ -0,0 +1,127 @@
+import csv
+import io
+import json
+import os
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework import renderers
+
+from constants import SHOPPING_LIST_PDF_FONT
+
+
+class ShoppingListRenderer(renderers.BaseRenderer):
+    """Базовый рендерер списка покупок.
+
+    Строки списка отдаются по одной через stream(), чтобы ответ можно было
+    передавать StreamingHttpResponse без сборки документа в памяти.
+    render() используется только для ошибок (пустая корзина, нет доступа).
+    """
+
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            data = '\n'.join(str(value) for value in data.values())
+        return str(data).encode(self.charset)
+
+    def stream(self, rows):
+        """Генератор частей документа по строкам (name, unit, amount)."""
+        raise NotImplementedError
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, rows):
+        for name, measurement_unit, amount in rows:
+            yield f'{name} - {amount} {measurement_unit}\n'
+
+
+class _Echo:
+    """Псевдо-файл для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, rows):
+        writer = csv.writer(_Echo())
+        yield writer.writerow(('name', 'measurement_unit', 'amount'))
+        for row in rows:
+            yield writer.writerow(row)
+
+
+class ShoppingListJSONRenderer(ShoppingListRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False).encode(self.charset)
+
+    def stream(self, rows):
+        yield '['
+        separator = ''
+        for name, measurement_unit, amount in rows:
+            yield separator + json.dumps({
+                'name': name,
+                'measurement_unit': measurement_unit,
+                'amount': amount
+            }, ensure_ascii=False)
+            separator = ','
+        yield ']'
+
+
+class ShoppingListPDFRenderer(ShoppingListRenderer):
+    """PDF собирается целиком: reportlab пишет документ только в save()."""
+
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    font_size = 12
+    margin = 50
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+    def get_font(self):
+        if not os.path.exists(SHOPPING_LIST_PDF_FONT):
+            return 'Helvetica'
+        name = os.path.splitext(os.path.basename(SHOPPING_LIST_PDF_FONT))[0]
+        if name not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(TTFont(name, SHOPPING_LIST_PDF_FONT))
+        return name
+
+    def stream(self, rows):
+        buffer = io.BytesIO()
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        font = self.get_font()
+        top = A4[1] - self.margin
+        line_height = self.font_size * 1.5
+        pdf.setFont(font, self.font_size)
+        y = top
+        for name, measurement_unit, amount in rows:
+            if y < self.margin:
+                pdf.showPage()
+                pdf.setFont(font, self.font_size)
+                y = top
+            pdf.drawString(self.margin, y,
+                           f'{name} - {amount} {measurement_unit}')
+            y -= line_height
+        pdf.save()
+        yield buffer.getvalue()
+
+
+SHOPPING_LIST_RENDERERS = (
+    ShoppingListTextRenderer,
+    ShoppingListCSVRenderer,
+    ShoppingListJSONRenderer,
+    ShoppingListPDFRenderer,
+)
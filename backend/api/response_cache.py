@@ -0,0 +1,150 @@
+import copy
+import hashlib
+import uuid
+
+from django.core.cache import cache, caches
+from django.db import transaction
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from rest_framework import status
+from rest_framework.response import Response
+
+from constants import (RECIPE_RESPONSE_CACHE_TIMEOUT, RECIPE_RESPONSE_MAX_AGE,
+                       VERSIONS_CACHE)
+from foodgram.models import Favorited, ShoppingCart, Subscriptions
+
+RECIPES_TAG = 'recipes'
+REFERENCE_TAG = 'reference'
+
+
+def recipe_tag(recipe_id):
+    return f'recipe:{recipe_id}'
+
+
+def get_tag_versions(tags):
+    versions_cache = caches[VERSIONS_CACHE]
+    versions = versions_cache.get_many([f'tag:{tag}' for tag in tags])
+    missing = {
+        f'tag:{tag}': uuid.uuid4().hex
+        for tag in tags if f'tag:{tag}' not in versions
+    }
+    if missing:
+        versions_cache.set_many(missing, timeout=None)
+        versions.update(missing)
+    return [versions[f'tag:{tag}'] for tag in tags]
+
+
+def invalidate_tags(*tags):
+    """Сменить версии тегов после коммита текущей транзакции.
+
+    Иначе параллельный запрос успел бы закешировать старые данные
+    под новой версией.
+    """
+    def bump():
+        caches[VERSIONS_CACHE].set_many(
+            {f'tag:{tag}': uuid.uuid4().hex for tag in tags}, timeout=None
+        )
+    transaction.on_commit(bump)
+
+
+def apply_user_flags(user, recipes):
+    """Наложить флаги пользователя на закешированные данные рецептов."""
+    recipe_ids = [recipe['id'] for recipe in recipes]
+    author_ids = {recipe['author']['id'] for recipe in recipes}
+    favorited = set(Favorited.objects.filter(
+        user=user, recipe_id__in=recipe_ids
+    ).values_list('recipe_id', flat=True))
+    in_cart = set(ShoppingCart.objects.filter(
+        user=user, recipe_id__in=recipe_ids
+    ).values_list('recipe_id', flat=True))
+    subscribed = set(Subscriptions.objects.filter(
+        user=user, author_id__in=author_ids
+    ).values_list('author_id', flat=True))
+    for recipe in recipes:
+        recipe['is_favorited'] = recipe['id'] in favorited
+        recipe['is_in_shopping_cart'] = recipe['id'] in in_cart
+        recipe['author']['is_subscribed'] = (
+            recipe['author']['id'] in subscribed
+        )
+
+
+def clear_user_flags(recipes):
+    for recipe in recipes:
+        recipe['is_favorited'] = False
+        recipe['is_in_shopping_cart'] = False
+        recipe['author']['is_subscribed'] = False
+
+
+class RecipeResponseCacheMixin:
+    """Кеш ответов списка и карточки рецептов.
+
+    В кеше лежит ответ, каким его видит анонимный пользователь. Ключ
+    строится из нормализованных параметров запроса и версий тегов
+    инвалидации; авторизованным поверх него накладываются их флаги.
+    """
+
+    uncacheable_params = ('is_favorited', 'is_in_shopping_cart')
+
+    def get_cache_tags(self):
+        if self.action == 'retrieve':
+            return [REFERENCE_TAG, recipe_tag(self.kwargs['pk'])]
+        return [REFERENCE_TAG, RECIPES_TAG]
+
+    def get_response_cache_key(self):
+        request = self.request
+        params = sorted(
+            (key, sorted(values))
+            for key, values in request.query_params.lists()
+        )
+        versions = get_tag_versions(self.get_cache_tags())
+        raw = (f'{self.action}:{request.get_host()}:{request.path}:'
+               f'{params}:{versions}')
+        return 'recipe_response:' + hashlib.md5(raw.encode()).hexdigest()
+
+    def get_cached_recipes(self, data):
+        if self.action == 'retrieve':
+            return [data]
+        return data['results'] if isinstance(data, dict) else data
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if any(param in request.query_params
+               for param in self.uncacheable_params):
+            return handler(request, *args, **kwargs)
+        key = self.get_response_cache_key()
+        etag = f'"{key.split(":")[1]}"'
+        user = request.user
+        data = cache.get(key)
+        if data is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            data = response.data
+            if user.is_authenticated:
+                anonymous_data = copy.deepcopy(data)
+                clear_user_flags(self.get_cached_recipes(anonymous_data))
+                cache.set(key, anonymous_data, RECIPE_RESPONSE_CACHE_TIMEOUT)
+            else:
+                cache.set(key, data, RECIPE_RESPONSE_CACHE_TIMEOUT)
+        elif user.is_authenticated:
+            apply_user_flags(user, self.get_cached_recipes(data))
+        if user.is_authenticated:
+            response = Response(data)
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            if request.headers.get('If-None-Match') == etag:
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                response = Response(data)
+            response['ETag'] = etag
+            patch_cache_control(
+                response, public=True, max_age=RECIPE_RESPONSE_MAX_AGE
+            )
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
@@ -1,9 +1,18 @@
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
 
+from api.reference_data import ingredient_reference, tag_reference
+from api.response_cache import apply_user_flags
 from api.users_serializers import Base64ImageField, UserSerializer
 from constants import (MAX_AMOUNT, MAX_COOKING_TIME, MIN_AMOUNT,
-                       MIN_COOKING_TIME)
-from foodgram.models import AmountIngredients, Ingredient, Recipe, Tag
+                       MIN_COOKING_TIME, RECIPE_FRAGMENT_CACHE_TIMEOUT)
+from foodgram.images import schedule_recipe_image
+from foodgram.models import (AmountIngredients, Ingredient, Recipe,
+                             ShoppingCartIngredient, Tag)
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -20,8 +29,73 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit')
 
 
+def resolve_reference_ids(reference, ids):
+    """Объекты справочника по списку id одним проходом.
+
+    Возвращает найденные объекты в порядке ids; если каких-то id нет,
+    поднимает одну ошибку со всеми отсутствующими id.
+    """
+    found = reference.resolve(ids)
+    missing = [pk for pk in dict.fromkeys(ids) if pk not in found]
+    if missing:
+        raise serializers.ValidationError(
+            'Не найдены объекты с id: '
+            + ', '.join(str(pk) for pk in missing)
+        )
+    return [found[pk] for pk in ids]
+
+
+class ReferencePrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """id объекта справочника.
+
+    Поле только проверяет тип id: сами объекты подставляются пакетно
+    на уровне списка (ReferenceManyRelatedField,
+    RecipeIngredientListSerializer).
+    """
+
+    def __init__(self, reference, **kwargs):
+        self.reference = reference
+        super().__init__(**kwargs)
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return ReferenceManyRelatedField(**list_kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
+class ReferenceManyRelatedField(serializers.ManyRelatedField):
+
+    def to_internal_value(self, data):
+        ids = super().to_internal_value(data)
+        return resolve_reference_ids(self.child_relation.reference, ids)
+
+
+class RecipeIngredientListSerializer(serializers.ListSerializer):
+
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        ingredients = resolve_reference_ids(
+            ingredient_reference, [item['ingredient'] for item in items]
+        )
+        for item, ingredient in zip(items, ingredients):
+            item['ingredient'] = ingredient
+        return items
+
+
 class RecipeIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
+    id = ReferencePrimaryKeyRelatedField(
+        ingredient_reference,
         source='ingredient',
         queryset=Ingredient.objects.all()
     )
@@ -39,58 +113,146 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
     class Meta:
         model = AmountIngredients
         fields = ('id', 'name', 'measurement_unit', 'amount')
+        list_serializer_class = RecipeIngredientListSerializer
+
+
+RECIPE_PREFETCH = (
+    'tags',
+    Prefetch(
+        'amount_ingredients',
+        queryset=AmountIngredients.objects.select_related('ingredient')
+    )
+)
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        if isinstance(data, models.Manager):
+            data = data.all()
+        return self.child.represent_many(list(data))
 
 
 class RecipeSerializer(serializers.ModelSerializer):
+    """Рецепт для чтения.
+
+    Общая для всех пользователей часть рецепта кешируется фрагментом
+    по id и версиям рецепта, автора и справочников; флаги текущего
+    пользователя накладываются поверх фрагмента.
+    """
 
     tags = TagSerializer(many=True)
     author = UserSerializer(read_only=True)
-    ingredients = RecipeIngredientSerializer(
-        many=True,
-        read_only=True
-    )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
-    ingredients = ingredients = RecipeIngredientSerializer(
+    ingredients = RecipeIngredientSerializer(
         source='amount_ingredients',
         many=True
     )
+    image_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = (
             'id', 'tags', 'author', 'ingredients', 'is_favorited',
-            'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time'
+            'is_in_shopping_cart', 'name', 'image', 'image_srcset', 'text',
+            'cooking_time'
         )
         extra_kwargs = {
             'author': {'read_only': True}
         }
+        list_serializer_class = RecipeListSerializer
 
-    def get_is_favorited(self, obj):
+    def to_representation(self, instance):
+        return self.represent_many([instance])[0]
+
+    def get_fragment_key(self, recipe, versions):
+        return 'recipe_fragment:{}:{}:{}:{}'.format(
+            recipe.pk,
+            recipe.updated_at and recipe.updated_at.timestamp(),
+            recipe.author.updated_at and recipe.author.updated_at.timestamp(),
+            versions
+        )
+
+    def get_fragment_versions(self):
         request = self.context.get('request')
-        if request:
-            return False
-        user = request.user
-        if user.is_authenticated:
-            return obj in user.favorited.all()
+        return ':'.join(map(str, (
+            request.get_host() if request else '',
+            tag_reference.get_version(),
+            ingredient_reference.get_version()
+        )))
+
+    def represent_many(self, recipes):
+        versions = self.get_fragment_versions()
+        keys = [self.get_fragment_key(recipe, versions) for recipe in recipes]
+        fragments = cache.get_many(keys)
+        missing = [
+            recipe for recipe, key in zip(recipes, keys)
+            if key not in fragments
+        ]
+        if missing:
+            prefetch_related_objects(missing, *RECIPE_PREFETCH)
+            built = {}
+            for recipe in missing:
+                # Флаги пользователя во фрагмент не попадают
+                recipe.author.is_subscribed = False
+                built[self.get_fragment_key(recipe, versions)] = (
+                    super().to_representation(recipe)
+                )
+            cache.set_many(built, RECIPE_FRAGMENT_CACHE_TIMEOUT)
+            fragments.update(built)
+        representations = [fragments[key] for key in keys]
+        self.apply_user_flags(recipes, representations)
+        return representations
+
+    def apply_user_flags(self, recipes, representations):
+        request = self.context.get('request')
+        if request is None or not request.user.is_authenticated:
+            return
+        if not all(hasattr(recipe, 'author_is_subscribed')
+                   for recipe in recipes):
+            apply_user_flags(request.user, representations)
+            return
+        for recipe, data in zip(recipes, representations):
+            data['is_favorited'] = recipe.is_favorited
+            data['is_in_shopping_cart'] = recipe.is_in_shopping_cart
+            data['author']['is_subscribed'] = recipe.author_is_subscribed
+
+    def get_is_favorited(self, obj):
         return False
 
     def get_is_in_shopping_cart(self, obj):
-        request = self.context.get('request')
-        if request is None:
-            return False
-        user = request.user
-        if user.is_authenticated:
-            return obj in user.shopping_cart.all()
         return False
 
+    def get_image_srcset(self, obj):
+        """srcset по форматам; пусто, пока копии не готовы."""
+        request = self.context.get('request')
+        srcset = {}
+        widths = set()
+        for variant in obj.image_variants.values():
+            # Копии, сделанные до отсечения дублей, могут совпадать по ширине
+            if variant['width'] in widths:
+                continue
+            widths.add(variant['width'])
+            for fmt, name in variant.items():
+                if fmt == 'width':
+                    continue
+                url = default_storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                srcset.setdefault(fmt, []).append(
+                    f'{url} {variant["width"]}w'
+                )
+        return {fmt: ', '.join(items) for fmt, items in srcset.items()}
+
 
 class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
     ingredients = RecipeIngredientSerializer(
         source='amount_ingredients',
         many=True
     )
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = ReferencePrimaryKeyRelatedField(
+        tag_reference,
         queryset=Tag.objects.all(),
         many=True
     )
@@ -118,27 +280,69 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         ]
         AmountIngredients.objects.bulk_create(amount_ingredients)
 
+    def update_amount_ingredients(self, recipe, ingredients_data):
+        """Применить к ингредиентам рецепта только разницу с текущими."""
+        current = {
+            item.ingredient_id: item
+            for item in recipe.amount_ingredients.all()
+        }
+        incoming = {
+            item['ingredient'].id: item['amount']
+            for item in ingredients_data
+        }
+        changed = []
+        for ingredient_id, amount in incoming.items():
+            item = current.get(ingredient_id)
+            if item is not None and item.amount != amount:
+                item.amount = amount
+                changed.append(item)
+        added = [
+            AmountIngredients(recipe=recipe, ingredient_id=ingredient_id,
+                              amount=amount)
+            for ingredient_id, amount in incoming.items()
+            if ingredient_id not in current
+        ]
+        removed = current.keys() - incoming.keys()
+        if not (changed or added or removed):
+            return
+        ShoppingCartIngredient.objects.remove_recipe(recipe.id)
+        if removed:
+            recipe.amount_ingredients.filter(
+                ingredient_id__in=removed
+            ).delete()
+        if changed:
+            AmountIngredients.objects.bulk_update(changed, ['amount'])
+        if added:
+            AmountIngredients.objects.bulk_create(added)
+        ShoppingCartIngredient.objects.add_recipe(recipe.id)
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients_data = validated_data.pop('amount_ingredients')
         tags_data = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags_data)
         self.create_amount_ingredients(recipe, ingredients_data)
+        schedule_recipe_image(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients_data = validated_data.pop('amount_ingredients', None)
         tags_data = validated_data.pop('tags', None)
+        if 'image' in validated_data:
+            validated_data['image_variants'] = {}
         instance = super().update(instance, validated_data)
+        if 'image' in validated_data:
+            schedule_recipe_image(instance)
         if tags_data is not None:
             instance.tags.set(tags_data)
         if ingredients_data is not None:
-            instance.amount_ingredients.all().delete()
-            self.create_amount_ingredients(instance, ingredients_data)
+            self.update_amount_ingredients(instance, ingredients_data)
         return instance
 
     def to_representation(self, instance):
-        serializer = RecipeSerializer(instance)
+        serializer = RecipeSerializer(instance, context=self.context)
         return serializer.data
 
     def validate(self, data):
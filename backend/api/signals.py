@@ -0,0 +1,79 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from api.reference_data import ingredient_reference, tag_reference
+from api.response_cache import (RECIPES_TAG, REFERENCE_TAG, invalidate_tags,
+                                recipe_tag)
+from foodgram.models import AmountIngredients, Ingredient, Recipe, Tag
+from foodgram.short_links import forget_short_code
+
+User = get_user_model()
+
+
+def touch_recipes(recipe_ids):
+    # Ключ фрагмента рецепта строится по updated_at: меняем его и при
+    # правках ингредиентов и тегов в обход сохранения рецепта
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        updated_at=timezone.now()
+    )
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredients(sender, **kwargs):
+    ingredient_reference.invalidate()
+    invalidate_tags(REFERENCE_TAG)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tags_reference(sender, **kwargs):
+    tag_reference.invalidate()
+    invalidate_tags(REFERENCE_TAG)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe(sender, instance, **kwargs):
+    invalidate_tags(RECIPES_TAG, recipe_tag(instance.pk))
+
+
+@receiver(post_delete, sender=Recipe)
+def forget_recipe_short_code(sender, instance, **kwargs):
+    forget_short_code(instance.short_code)
+
+
+@receiver(post_save, sender=AmountIngredients)
+@receiver(post_delete, sender=AmountIngredients)
+def invalidate_recipe_ingredients(sender, instance, **kwargs):
+    touch_recipes([instance.recipe_id])
+    invalidate_tags(RECIPES_TAG, recipe_tag(instance.recipe_id))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        touch_recipes([instance.pk])
+        invalidate_tags(RECIPES_TAG, recipe_tag(instance.pk))
+    elif pk_set:
+        touch_recipes(pk_set)
+        invalidate_tags(RECIPES_TAG, *map(recipe_tag, pk_set))
+    else:
+        # После clear() рецепты тега уже не найти: сбрасываем все фрагменты
+        tag_reference.invalidate()
+        invalidate_tags(RECIPES_TAG, REFERENCE_TAG)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes(sender, instance, created, update_fields,
+                              **kwargs):
+    # Вход пользователя обновляет только last_login
+    if created or update_fields and set(update_fields) <= {'last_login'}:
+        return
+    recipe_ids = instance.recipes.values_list('id', flat=True)
+    invalidate_tags(RECIPES_TAG, *map(recipe_tag, recipe_ids))
@@ -1,32 +1,141 @@
 import base64
+import binascii
+import tempfile
+import warnings
 
 from django.contrib.auth import get_user_model
-from django.core.files.base import ContentFile
+from django.core.files import File
 from django.core.validators import RegexValidator
+from django.db import models
+from PIL import Image
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
 
-from constants import MAX_EMAIL, MAX_USERNAME
-from foodgram.models import Recipe
+from constants import (BASE64_CHUNK_SIZE, IMAGE_MAX_PIXELS,
+                       IMAGE_MAX_UPLOAD_SIZE, IMAGE_SPOOL_SIZE, MAX_EMAIL,
+                       MAX_USERNAME)
+from foodgram.models import Recipe, Subscriptions
 
 User = get_user_model()
 
 
 class Base64ImageField(serializers.ImageField):
+    """Изображение в base64 (data:image/...) или multipart-файлом.
+
+    base64 декодируется частями во временный файл, который остаётся
+    в памяти только до IMAGE_SPOOL_SIZE. Размер файла и число пикселей
+    проверяются по заголовку до полного декодирования изображения.
+    """
+
+    default_error_messages = {
+        'invalid_base64': 'Некорректные данные изображения в base64.',
+        'too_large': 'Размер изображения превышает {max_size} байт.',
+        'too_many_pixels': 'Изображение больше {max_pixels} пикселей.',
+        'unreadable': 'Не удалось прочитать заголовок изображения.',
+    }
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            data = self.decode_base64(data)
+        if hasattr(data, 'seek'):
+            self.check_image(data)
         return super().to_internal_value(data)
 
+    def decode_base64(self, data):
+        header, separator, body = data.partition(';base64,')
+        ext = header.split('/')[-1]
+        if not separator or not ext.isalnum():
+            self.fail('invalid_base64')
+        if len(body) * 3 // 4 > IMAGE_MAX_UPLOAD_SIZE:
+            self.fail('too_large', max_size=IMAGE_MAX_UPLOAD_SIZE)
+        file = tempfile.SpooledTemporaryFile(max_size=IMAGE_SPOOL_SIZE)
+        tail = ''
+        try:
+            for start in range(0, len(body), BASE64_CHUNK_SIZE):
+                # Переносы строк допустимы, но validate=True их отвергает;
+                # остаток до кратности 4 переходит в следующий кусок
+                chunk = tail + ''.join(
+                    body[start:start + BASE64_CHUNK_SIZE].split()
+                )
+                cut = len(chunk) - len(chunk) % 4
+                file.write(base64.b64decode(chunk[:cut], validate=True))
+                tail = chunk[cut:]
+            if tail:
+                raise binascii.Error('Incorrect padding')
+        except binascii.Error:
+            file.close()
+            self.fail('invalid_base64')
+        file.seek(0)
+        return File(file, name='temp.' + ext)
+
+    def check_image(self, file):
+        if file.size > IMAGE_MAX_UPLOAD_SIZE:
+            self.fail('too_large', max_size=IMAGE_MAX_UPLOAD_SIZE)
+        file.seek(0)
+        try:
+            # open() читает только заголовок, пиксели не декодируются
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+                width, height = Image.open(file).size
+        except Image.DecompressionBombError:
+            self.fail('too_many_pixels', max_pixels=IMAGE_MAX_PIXELS)
+        except OSError:
+            self.fail('unreadable')
+        finally:
+            file.seek(0)
+        if width * height > IMAGE_MAX_PIXELS:
+            self.fail('too_many_pixels', max_pixels=IMAGE_MAX_PIXELS)
+
     def to_representation(self, value):
         if value:
             return value.url
         return None
 
 
-class UserSerializer(serializers.ModelSerializer):
+class SubscriptionStatusMixin:
+    """is_subscribed по общему для запроса множеству подписок.
+
+    Статусы подписки текущего пользователя накапливаются в контексте
+    сериализатора (subscribed_ids: id автора -> bool), поэтому список
+    пользователей или авторов проверяется одним запросом, а вложенные
+    сериализаторы переиспользуют уже загруженное.
+    """
+
+    def preload_subscriptions(self, authors):
+        request = self.context.get('request')
+        if request is None or not request.user.is_authenticated:
+            return
+        known = self.context.setdefault('subscribed_ids', {})
+        missing = {
+            author.pk for author in authors
+            if getattr(author, 'is_subscribed', None) is None
+        } - known.keys()
+        if not missing:
+            return
+        subscribed = set(Subscriptions.objects.filter(
+            user=request.user, author_id__in=missing
+        ).values_list('author_id', flat=True))
+        known.update({pk: pk in subscribed for pk in missing})
+
+    def get_is_subscribed(self, obj):
+        annotated = getattr(obj, 'is_subscribed', None)
+        if annotated is not None:
+            return annotated
+        self.preload_subscriptions([obj])
+        return self.context.get('subscribed_ids', {}).get(obj.pk, False)
+
+
+class UserListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        if isinstance(data, models.Manager):
+            data = data.all()
+        data = list(data)
+        self.child.preload_subscriptions(data)
+        return super().to_representation(data)
+
+
+class UserSerializer(SubscriptionStatusMixin, serializers.ModelSerializer):
     """Сериализатор для редактирования администратором."""
 
     email = serializers.EmailField(
@@ -52,15 +161,7 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ('id', 'username', 'email', 'first_name',
                   'last_name', 'is_subscribed', 'avatar', 'password')
         read_only_fields = ('avatar', 'is_subscribed')
-
-    def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        if request is None:
-            return False
-        user = request.user
-        if user in obj.follower.all():
-            return True
-        return False
+        list_serializer_class = UserListSerializer
 
     def create(self, validated_data):
         user = User.objects.create_user(
@@ -100,7 +201,24 @@ class SubscribRiciptesSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'image', 'cooking_time')
 
 
-class SubscribeSerializer(serializers.ModelSerializer):
+class SubscribeListSerializer(UserListSerializer):
+
+    def to_representation(self, data):
+        if isinstance(data, models.Manager):
+            data = data.all()
+        data = list(data)
+        self.child.attach_recipes(data)
+        return super().to_representation(data)
+
+
+class SubscribeSerializer(SubscriptionStatusMixin,
+                          serializers.ModelSerializer):
+    """Автор в подписках с его последними рецептами.
+
+    Рецепты всех авторов страницы выбираются одним запросом с
+    ограничением recipes_limit на каждого автора.
+    """
+
     recipes = serializers.SerializerMethodField()
     is_subscribed = serializers.SerializerMethodField()
     recipes_count = serializers.SerializerMethodField()
@@ -111,28 +229,42 @@ class SubscribeSerializer(serializers.ModelSerializer):
             'email', 'id', 'username', 'first_name', 'last_name',
             'is_subscribed', 'recipes', 'recipes_count', 'avatar'
         )
+        list_serializer_class = SubscribeListSerializer
 
-    def get_is_subscribed(self, obj):
-        request = self.context['request']
+    def get_recipes_limit(self):
+        request = self.context.get('request')
         if request is None:
-            return False
-        user = request.user
-        if user in obj.follower.all():
-            return True
-        return False
+            return None
+        try:
+            return max(int(request.query_params['recipes_limit']), 0)
+        except (KeyError, ValueError):
+            return None
+
+    def attach_recipes(self, authors):
+        recipes = {author.pk: [] for author in authors}
+        for recipe in (
+            Recipe.objects.latest_per_author(
+                list(recipes), self.get_recipes_limit()
+            )
+            .only('id', 'name', 'image', 'cooking_time', 'author_id')
+            .order_by('-pub_date', '-pk')
+        ):
+            recipes[recipe.author_id].append(recipe)
+        for author in authors:
+            author.subscription_recipes = recipes[author.pk]
+
+    def to_representation(self, instance):
+        if not hasattr(instance, 'subscription_recipes'):
+            self.attach_recipes([instance])
+        return super().to_representation(instance)
 
     def get_recipes_count(self, obj):
+        annotated = getattr(obj, 'recipes_count', None)
+        if annotated is not None:
+            return annotated
         return obj.recipes.count()
 
     def get_recipes(self, obj):
-        request = self.context['request']
-        recipes_limit = request.query_params.get('recipes_limit')
-        queryset = obj.recipes.all()
-
-        if recipes_limit:
-            try:
-                recipes_limit = int(recipes_limit)
-                queryset = queryset[:recipes_limit]
-            except ValueError:
-                pass
-        return SubscribRiciptesSerializer(queryset, many=True).data
+        return SubscribRiciptesSerializer(
+            obj.subscription_recipes, many=True
+        ).data
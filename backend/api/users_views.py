@@ -1,5 +1,6 @@
 from django.contrib.auth import get_user_model
 from django.db import IntegrityError
+from django.db.models import BooleanField, Count, Value
 from django.shortcuts import get_object_or_404
 from rest_framework import filters, permissions, status, viewsets
 from rest_framework.decorators import action
@@ -167,7 +168,10 @@ class UserViewSet(viewsets.ModelViewSet):
     def subscriptions(self, request):
         subscribed_authors = User.objects.filter(
             following__user=request.user
-        )
+        ).annotate(
+            recipes_count=Count('recipes'),
+            is_subscribed=Value(True, output_field=BooleanField())
+        ).order_by('-following__sub_date', 'pk')
         serializer_context = {'request': request}
         page = self.paginate_queryset(subscribed_authors)
         serializer = self.get_serializer(
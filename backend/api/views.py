@@ -1,59 +1,119 @@
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import BooleanField, Exists, OuterRef, Value
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import permissions, status, viewsets
+from rest_framework import filters, permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from api.reference_data import ingredient_reference, tag_reference
+from api.response_cache import RecipeResponseCacheMixin
 from api.users_serializers import SubscribRiciptesSerializer
-from foodgram.models import (AmountIngredients, Favorited, Ingredient, Recipe,
-                             ShoppingCart, Tag)
+from constants import (INGREDIENT_SEARCH_LIMIT, MAX_INGREDIENT_SEARCH_LIMIT,
+                       SHOPPING_LIST_CHUNK_SIZE)
+from foodgram.models import (Favorited, Ingredient, Recipe, ShoppingCart,
+                             ShoppingCartIngredient, Subscriptions, Tag)
 
+from .filters import RecipeFilter
+from .pagination import RecipeCursorPagination, RecipPagination
 from .permissions import UpdateOnlyAdminOrAuthor
+from .renderers import SHOPPING_LIST_RENDERERS
 from .serializers import (IngredientSerializer, RecipeCreateUpdateSerializer,
                           RecipeSerializer, TagSerializer)
 
 User = get_user_model()
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class ReferenceDataMixin:
+    """Список справочника из снимка в памяти с поддержкой ETag."""
+
+    reference = None
+
+    def reference_response(self, snapshot, data):
+        headers = {'ETag': snapshot.etag}
+        if self.request.headers.get('If-None-Match') == snapshot.etag:
+            return Response(status=status.HTTP_304_NOT_MODIFIED,
+                            headers=headers)
+        return Response(data, headers=headers)
+
+    def list(self, request, *args, **kwargs):
+        snapshot = self.reference.get()
+        return self.reference_response(snapshot, snapshot.items)
+
+
+class TagViewSet(ReferenceDataMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
+    reference = tag_reference
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ReferenceDataMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
+    reference = ingredient_reference
+
+    def get_limit(self, default):
+        try:
+            limit = int(self.request.query_params['limit'])
+        except (KeyError, ValueError):
+            return default
+        return min(max(limit, 1), MAX_INGREDIENT_SEARCH_LIMIT)
+
+    def list(self, request, *args, **kwargs):
+        """Поиск по ?name=: сначала совпадения по началу названия."""
+        snapshot = self.reference.get()
+        name = request.query_params.get('name')
+        if not name:
+            return self.reference_response(
+                snapshot, snapshot.items[:self.get_limit(None)]
+            )
+        limit = self.get_limit(INGREDIENT_SEARCH_LIMIT)
+        return self.reference_response(
+            snapshot, snapshot.index.search(name, limit)
+        )
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(RecipeResponseCacheMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = [UpdateOnlyAdminOrAuthor]
-    filter_backends = (DjangoFilterBackend,)
+    filter_backends = (DjangoFilterBackend, filters.OrderingFilter)
+    filterset_class = RecipeFilter
+    ordering_fields = ('pub_date', 'favorites_count', 'in_cart_count')
+    pagination_class = RecipPagination
 
     def get_queryset(self):
 
         queryset = super().get_queryset()
 
-        queryset = queryset.select_related('author').prefetch_related('tags')
-
-        author_id = self.request.query_params.get('author')
-        tags = self.request.query_params.getlist('tags')
-        is_favorited = self.request.query_params.get('is_favorited')
-        if author_id:
-            queryset = queryset.filter(author_id=author_id)
-
-        if tags:
-            queryset = queryset.filter(tags__slug__in=tags).distinct()
-
-        if is_favorited == '1':
-            queryset = queryset.filter(favorited_by__user=self.request.user)
+        # Теги и ингредиенты подгружает RecipeSerializer только для
+        # рецептов, которых нет в кеше фрагментов
+        queryset = queryset.select_related('author')
+        return self.annotate_user_flags(queryset)
 
-        return queryset
+    def annotate_user_flags(self, queryset):
+        """Флаги избранного, корзины и подписки на автора для всей страницы."""
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+                author_is_subscribed=Value(False, output_field=BooleanField())
+            )
+        return queryset.annotate(
+            is_favorited=Exists(Favorited.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            author_is_subscribed=Exists(Subscriptions.objects.filter(
+                user=user, author=OuterRef('author')
+            ))
+        )
 
     def get_serializer_class(self):
         if self.action in ['create', 'partial_update', 'update']:
@@ -63,6 +123,23 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[permissions.IsAuthenticated],
+        pagination_class=RecipeCursorPagination
+    )
+    def feed(self, request):
+        """Рецепты авторов из подписок, от новых к старым (?cursor=)."""
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            author__in=Subscriptions.objects.filter(
+                user=request.user
+            ).values('author')
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     @action(
         detail=True,
         methods=['post', 'delete'],
@@ -79,13 +156,14 @@ class RecipeViewSet(viewsets.ModelViewSet):
                     {'errors': 'Рецепт уже в избранном'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            Favorited.objects.create(user=user, recipe=recipe)
+            with transaction.atomic():
+                Favorited.objects.create(user=user, recipe=recipe)
             serializer = SubscribRiciptesSerializer(recipe)
             return Response(serializer.data,
                             status=status.HTTP_201_CREATED
                             )
 
-        favorited = user.favorited.filter(pk=recipe.pk)
+        favorited = user.favorited.filter(recipe=recipe)
 
         if not favorited:
             return Response(
@@ -105,16 +183,17 @@ class RecipeViewSet(viewsets.ModelViewSet):
         user = request.user
 
         if request.method == 'POST':
-            if user.shopping_cart.filter(pk=recipe.pk).exists():
+            if user.shopping_cart.filter(recipe=recipe).exists():
                 return Response(
                     {'errors': 'Рецепт уже в списке покупок'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            ShoppingCart.objects.create(user=user, recipe=recipe)
+            with transaction.atomic():
+                ShoppingCart.objects.create(user=user, recipe=recipe)
             serializer = SubscribRiciptesSerializer(recipe)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        shopping_cart = user.shopping_cart.filter(pk=recipe.pk)
+        shopping_cart = user.shopping_cart.filter(recipe=recipe)
 
         if not shopping_cart:
             return Response(
@@ -127,9 +206,11 @@ class RecipeViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'],
             url_path='get-link')
     def get_link(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, pk=pk)
+        recipe = get_object_or_404(Recipe.objects.only('short_code'), pk=pk)
         return Response(
-            {'short-link': recipe.get_short_url()},
+            {'short-link': request.build_absolute_uri(
+                recipe.get_short_url()
+            )},
             status=status.HTTP_200_OK
         )
 
@@ -137,39 +218,39 @@ class RecipeViewSet(viewsets.ModelViewSet):
         detail=False,
         methods=['get'],
         permission_classes=[permissions.IsAuthenticated],
+        renderer_classes=SHOPPING_LIST_RENDERERS,
         url_path='download_shopping_cart'
     )
     def download_shopping_cart(self, request):
+        """Список покупок в формате из ?format=txt|csv|json|pdf."""
         user = request.user
 
-        recipe_ids = user.shopping_cart.all().values_list(
-            'recipe_id', flat=True
-        )
-        if not recipe_ids:
+        if not user.shopping_cart.exists():
             return Response(
                 {'detail': 'Ваша корзина покупок пуста'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
         ingredients = (
-            AmountIngredients.objects
-            .filter(recipe_id__in=recipe_ids)
-            .values(
+            ShoppingCartIngredient.objects
+            .filter(user=user)
+            .values_list(
                 'ingredient__name',
-                'ingredient__measurement_unit'
+                'ingredient__measurement_unit',
+                'amount'
             )
-            .annotate(total_amount=Sum('amount'))
             .order_by('ingredient__name')
+            .iterator(chunk_size=SHOPPING_LIST_CHUNK_SIZE)
         )
 
-        text_content = "\n".join([
-            f"{item['ingredient__name']} - {item['total_amount']} "
-            f"{item['ingredient__measurement_unit']}"
-            for item in ingredients
-        ])
-        response = HttpResponse(
-            text_content, content_type='text/plain; charset=utf-8')
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        response = StreamingHttpResponse(
+            renderer.stream(ingredients), content_type=content_type
+        )
         response['Content-Disposition'] = (
-            'attachment; filename="shopping_list.txt"'
+            f'attachment; filename="shopping_list.{renderer.format}"'
         )
         return response
@@ -73,6 +73,34 @@ DATABASES = {
 }
 
 
+# Кеш должен быть общим для всех процессов gunicorn: в docker-compose
+# задан DatabaseCache (таблицы создаёт команда createcachetable).
+# LocMemCache подходит только для разработки в одном процессе.
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+CACHE_LOCATION = os.getenv('CACHE_LOCATION', 'default')
+
+CACHES = {
+    # Ответы, фрагменты рецептов и счётчики: по записи на рецепт и
+    # страницу, поэтому лимит заметно выше стандартных 300
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': CACHE_LOCATION,
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 200000)),
+        },
+    },
+    # Версии справочников и тегов инвалидации живут отдельно: вытеснение
+    # при заполнении основного кеша не должно их сбрасывать
+    'versions': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': f'{CACHE_LOCATION}_versions',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 10 ** 9},
+    },
+}
+
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -122,6 +150,8 @@ USE_TZ = True
 MEDIA_URL = '/media/'
 MEDIA_ROOT = '/media'
 
+DEFAULT_FILE_STORAGE = 'foodgram.storage.ContentAddressedStorage'
+
 STATIC_URL = '/static/'
 
 STATIC_ROOT = BASE_DIR / 'backend_static'
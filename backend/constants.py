@@ -9,3 +9,29 @@ MAX_RECIPE = 100
 MAX_SHORT_CODE = 8
 MAX_EMAIL = 254
 MAX_USERNAME = 150
+SHOPPING_LIST_CHUNK_SIZE = 500
+SHOPPING_LIST_PDF_FONT = '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+INGREDIENT_SEARCH_LIMIT = 50
+MAX_INGREDIENT_SEARCH_LIMIT = 200
+PAGINATION_COUNT_TIMEOUT = 60
+PAGINATION_ESTIMATE_THRESHOLD = 100000
+RECIPE_RESPONSE_CACHE_TIMEOUT = 300
+RECIPE_RESPONSE_MAX_AGE = 60
+RECIPE_FRAGMENT_CACHE_TIMEOUT = 3600
+VERSIONS_CACHE = 'versions'
+IMAGE_VARIANTS = {'thumbnail': 160, 'card': 480, 'full': 1280}
+IMAGE_VARIANT_FORMATS = ('webp', 'avif')
+IMAGE_VARIANT_QUALITY = 80
+IMAGE_WORKERS = 2
+IMAGE_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+IMAGE_MAX_PIXELS = 40_000_000
+IMAGE_SPOOL_SIZE = 1024 * 1024
+BASE64_CHUNK_SIZE = 64 * 1024
+SHORT_CODE_LENGTH = 6
+SHORT_CODE_ATTEMPTS = 5
+SHORT_LINK_LRU_SIZE = 4096
+SHORT_LINK_CACHE_TIMEOUT = 24 * 60 * 60
+LOAD_BATCH_SIZE = 5000
+LOAD_READ_CHUNK_SIZE = 64 * 1024
+SEARCH_CONFIG = 'russian'
+MAX_INGREDIENT_MATCH = 100
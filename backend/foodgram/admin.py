@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Ingredient, Recipe, Tag
+from .models import Ingredient, Recipe, ShoppingCartIngredient, Tag
 
 
 class RecipeIngredientInline(admin.TabularInline):
@@ -10,15 +10,20 @@ class RecipeIngredientInline(admin.TabularInline):
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'author', 'favorite_count')
+    list_display = ('name', 'author', 'favorites_count', 'in_cart_count')
     list_select_related = ('author',)
     search_fields = ('name', 'author__username', 'author__email')
     list_filter = ('tags',)  # Фильтрация по тегам
     inlines = [RecipeIngredientInline]
     filter_horizontal = ('tags',)  # Для удобного выбора тегов
 
-    def favorite_count(self, obj):
-        return obj.favorites.count()
+    def save_related(self, request, form, formsets, change):
+        # Инлайн сохраняет ингредиенты по одному, минуя сериализатор:
+        # итоги корзин пересчитываем дельтой вокруг всего сохранения
+        recipe = form.instance
+        ShoppingCartIngredient.objects.remove_recipe(recipe.pk)
+        super().save_related(request, form, formsets, change)
+        ShoppingCartIngredient.objects.add_recipe(recipe.pk)
 
 
 @admin.register(Ingredient)
@@ -0,0 +1,92 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image
+
+from constants import (IMAGE_VARIANT_FORMATS, IMAGE_VARIANT_QUALITY,
+                       IMAGE_VARIANTS, IMAGE_WORKERS)
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_executor():
+    """Локальный пул потоков: обработка не требует внешнего брокера."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=IMAGE_WORKERS, thread_name_prefix='images'
+        )
+    return _executor
+
+
+def supported_formats():
+    Image.init()
+    return [fmt for fmt in IMAGE_VARIANT_FORMATS if fmt.upper() in Image.SAVE]
+
+
+def variant_name(name, variant, fmt):
+    directory, filename = os.path.split(name)
+    base = os.path.splitext(filename)[0]
+    return os.path.join(directory, 'variants', f'{base}.{variant}.{fmt}')
+
+
+def build_variants(name):
+    """Уменьшенные копии изображения во всех поддерживаемых форматах."""
+    formats = supported_formats()
+    variants = {}
+    with default_storage.open(name) as file, Image.open(file) as source:
+        source.load()
+        if source.mode not in ('RGB', 'RGBA'):
+            source = source.convert('RGBA')
+        previous_width = 0
+        for variant, width in sorted(
+            IMAGE_VARIANTS.items(), key=lambda item: item[1]
+        ):
+            image = source.copy()
+            image.thumbnail((width, width * 4))
+            # thumbnail() не увеличивает: для узкого исходника копии
+            # крупнее предыдущей совпали бы с ней
+            if image.width <= previous_width:
+                break
+            previous_width = image.width
+            variants[variant] = {'width': image.width}
+            for fmt in formats:
+                target = variant_name(name, variant, fmt)
+                content = ContentFile(b'')
+                image.save(content, fmt.upper(),
+                           quality=IMAGE_VARIANT_QUALITY)
+                variants[variant][fmt] = default_storage.save(target, content)
+    return variants
+
+
+def process_recipe_image(recipe_id, name):
+    from foodgram.models import Recipe
+
+    close_old_connections()
+    try:
+        recipe = Recipe.objects.filter(pk=recipe_id, image=name).first()
+        if recipe is None:
+            return False
+        recipe.image_variants = build_variants(name)
+        # save(), а не update(): сигналы и updated_at сбрасывают кеши
+        recipe.save(update_fields=['image_variants', 'updated_at'])
+        return True
+    except Exception:
+        logger.exception('Не удалось обработать изображение %s', name)
+        return False
+    finally:
+        close_old_connections()
+
+
+def schedule_recipe_image(recipe):
+    """Поставить обработку изображения в очередь после коммита."""
+    recipe_id, name = recipe.pk, recipe.image.name
+    transaction.on_commit(
+        lambda: get_executor().submit(process_recipe_image, recipe_id, name)
+    )
@@ -0,0 +1,80 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Замеряет время ответа /api/recipes/ для заданных параметров.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--query',
+            default='',
+            help='Строка запроса, например "tags=breakfast&tags=lunch".'
+        )
+        parser.add_argument('--requests', type=int, default=100)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--user',
+            help='username, от имени которого выполнять запросы.'
+        )
+        parser.add_argument(
+            '--cached',
+            action='store_true',
+            help='Не отключать кеш ответов, фрагментов и счётчиков.'
+        )
+
+    def get_caches(self, cached):
+        if cached:
+            return settings.CACHES
+        # Иначе после прогрева замерялись бы попадания в кеш ответов;
+        # версии справочников остаются, чтобы не пересобирать снимки
+        return {
+            **settings.CACHES,
+            'default': {
+                'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+            },
+        }
+
+    def handle(self, *args, **options):
+        client = APIClient(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+        if options['user']:
+            try:
+                client.force_authenticate(
+                    User.objects.get(username=options['user'])
+                )
+            except User.DoesNotExist:
+                raise CommandError(f'Нет пользователя {options["user"]}')
+        url = f'/api/recipes/?{options["query"]}'
+
+        with override_settings(CACHES=self.get_caches(options['cached'])):
+            for _ in range(options['warmup']):
+                client.get(url)
+            timings = []
+            for _ in range(options['requests']):
+                start = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 200:
+                    raise CommandError(
+                        f'{url}: HTTP {response.status_code} '
+                        f'{response.content}'
+                    )
+
+        # inclusive: на малых выборках не выходить за пределы замеров
+        percentiles = statistics.quantiles(
+            timings, n=100, method='inclusive'
+        )
+        self.stdout.write(
+            f'{url}: {len(timings)} запросов, count='
+            f'{response.json()["count"]}\n'
+            f'p50={percentiles[49]:.1f} мс p95={percentiles[94]:.1f} мс '
+            f'p99={percentiles[98]:.1f} мс max={max(timings):.1f} мс'
+        )
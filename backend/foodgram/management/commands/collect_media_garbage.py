@@ -0,0 +1,78 @@
+import os
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from foodgram.models import Recipe
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Удаляет из хранилища изображения рецептов и аватары, '
+            'на которые не ссылается ни один рецепт или пользователь.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только показать неиспользуемые файлы, ничего не удаляя.'
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=3600,
+            help='Не трогать файлы моложе указанного числа секунд '
+                 '(загрузки незавершённых транзакций).'
+        )
+
+    def get_referenced(self):
+        referenced = set()
+        for name, variants in Recipe.objects.values_list(
+            'image', 'image_variants'
+        ).iterator():
+            referenced.add(name)
+            for variant in (variants or {}).values():
+                referenced.update(
+                    value for key, value in variant.items() if key != 'width'
+                )
+        referenced.update(
+            User.objects.exclude(avatar='').exclude(avatar__isnull=True)
+            .values_list('avatar', flat=True).iterator()
+        )
+        return referenced
+
+    def walk(self, directory):
+        if not default_storage.exists(directory):
+            return
+        directories, files = default_storage.listdir(directory)
+        for name in files:
+            yield os.path.join(directory, name)
+        for name in directories:
+            yield from self.walk(os.path.join(directory, name))
+
+    def handle(self, *args, **options):
+        directories = {
+            os.path.normpath(Recipe._meta.get_field('image').upload_to),
+            os.path.normpath(User._meta.get_field('avatar').upload_to),
+        }
+        referenced = self.get_referenced()
+        deadline = time.time() - options['min_age']
+        removed = size = 0
+        for directory in sorted(directories):
+            for name in self.walk(directory):
+                if name in referenced:
+                    continue
+                if os.path.getmtime(default_storage.path(name)) > deadline:
+                    continue
+                removed += 1
+                size += default_storage.size(name)
+                self.stdout.write(name)
+                if not options['verify']:
+                    default_storage.delete(name)
+        action = 'Найдено' if options['verify'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} неиспользуемых файлов: {removed} ({size} байт)'
+        ))
@@ -0,0 +1,283 @@
+import io
+import itertools
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from PIL import Image
+
+from api.response_cache import RECIPES_TAG, invalidate_tags
+from constants import LOAD_BATCH_SIZE, SHORT_CODE_LENGTH
+from foodgram.models import (AmountIngredients, Favorited, Ingredient, Recipe,
+                             ShoppingCart, Subscriptions, Tag)
+from foodgram.short_links import ALPHABET
+
+User = get_user_model()
+
+DEFAULT_TAGS = (
+    ('Завтрак', 'breakfast'),
+    ('Обед', 'lunch'),
+    ('Ужин', 'dinner'),
+    ('Десерт', 'dessert'),
+    ('Выпечка', 'bakery'),
+    ('Суп', 'soup'),
+    ('Салат', 'salad'),
+    ('Вегетарианское', 'vegetarian'),
+)
+
+
+def zipf_cum_weights(size, exponent):
+    """Накопленные веса распределения Ципфа для choices()."""
+    return list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, size + 1)
+    ))
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+@contextmanager
+def manual_dates(*fields):
+    """Временно отключить auto_now_add, чтобы задать даты вручную."""
+    saved = [field.auto_now_add for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in zip(fields, saved):
+            field.auto_now_add = value
+
+
+class Command(BaseCommand):
+    help = ('Генерирует синтетические данные для нагрузочных замеров: '
+            'пользователей, рецепты, избранное, корзины и подписки '
+            'с неравномерным (Ципф) распределением популярности.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Одинаковый seed на пустой базе даёт одинаковые данные.'
+        )
+        parser.add_argument('--batch-size', type=int, default=LOAD_BATCH_SIZE)
+        parser.add_argument('--prefix', default='fixture',
+                            help='Префикс username создаваемых пользователей.')
+        parser.add_argument('--ingredients-per-recipe', type=int, default=7)
+        parser.add_argument('--favorites-per-user', type=int, default=10)
+        parser.add_argument('--cart-per-user', type=int, default=2)
+        parser.add_argument('--subscriptions-per-user', type=int, default=5)
+        parser.add_argument(
+            '--skew',
+            type=float,
+            default=1.1,
+            help='Показатель распределения Ципфа для популярности.'
+        )
+
+    def bulk_create(self, model, objects, label):
+        started = time.monotonic()
+        total = 0
+        for batch in batched(objects, self.batch_size):
+            model.objects.bulk_create(batch)
+            total += len(batch)
+        elapsed = time.monotonic() - started
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(
+            f'{label}: {total} за {elapsed:.1f} с ({rate:.0f} строк/с)'
+        )
+
+    def sample(self, population, cum_weights, count, exclude=None):
+        """До count различных элементов с весами популярности."""
+        count = min(count, len(population) - (exclude is not None))
+        chosen = set()
+        for _ in range(count * 3):
+            if len(chosen) >= count:
+                break
+            item = self.rng.choices(population, cum_weights=cum_weights)[0]
+            if item != exclude:
+                chosen.add(item)
+        return chosen
+
+    def skewed_count(self, mean):
+        return int(self.rng.expovariate(1 / mean)) if mean > 0 else 0
+
+    def get_image(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (480, 320), (220, 180, 140)).save(buffer, 'PNG')
+        return default_storage.save(
+            'recipes/images/fixture.png', ContentFile(buffer.getvalue())
+        )
+
+    def create_users(self, count, prefix):
+        password = make_password('fixture-password')
+        self.bulk_create(User, (
+            User(
+                username=f'{prefix}_{number}',
+                email=f'{prefix}_{number}@example.com',
+                first_name=f'Имя{number}',
+                last_name=f'Фамилия{number}',
+                password=password
+            )
+            for number in range(count)
+        ), 'Пользователи')
+        return list(
+            User.objects.filter(username__startswith=f'{prefix}_')
+            .order_by('pk').values_list('pk', flat=True)
+        )
+
+    def generate_codes(self):
+        codes = set(Recipe.objects.values_list('short_code', flat=True))
+        while True:
+            code = ''.join(
+                self.rng.choice(ALPHABET) for _ in range(SHORT_CODE_LENGTH)
+            )
+            if code not in codes:
+                codes.add(code)
+                yield code
+
+    def create_recipes(self, count, author_ids, options):
+        image = self.get_image()
+        ingredient_ids = list(Ingredient.objects.values_list('pk', flat=True))
+        tag_ids = list(Tag.objects.values_list('pk', flat=True))
+        self.rng.shuffle(ingredient_ids)
+        ingredient_weights = zipf_cum_weights(len(ingredient_ids), 1.0)
+        tag_weights = zipf_cum_weights(len(tag_ids), 0.8)
+        author_weights = zipf_cum_weights(len(author_ids), options['skew'])
+        codes = self.generate_codes()
+        now = timezone.now()
+        started = time.monotonic()
+        created = 0
+        pub_date = Recipe._meta.get_field('pub_date')
+        with manual_dates(pub_date):
+            for numbers in batched(range(count), self.batch_size):
+                recipes = []
+                plans = {}
+                for number in numbers:
+                    recipe = Recipe(
+                        author_id=self.rng.choices(
+                            author_ids, cum_weights=author_weights
+                        )[0],
+                        name=f'Рецепт {number}',
+                        text=f'Описание рецепта {number}',
+                        cooking_time=self.rng.randint(5, 180),
+                        image=image,
+                        short_code=next(codes),
+                        pub_date=now - timedelta(
+                            seconds=self.rng.randint(0, 730 * 24 * 3600)
+                        )
+                    )
+                    recipes.append(recipe)
+                    plans[recipe.short_code] = (
+                        self.sample(
+                            ingredient_ids, ingredient_weights,
+                            max(1, self.skewed_count(
+                                options['ingredients_per_recipe']
+                            ))
+                        ),
+                        self.sample(tag_ids, tag_weights,
+                                    self.rng.randint(1, 3))
+                    )
+                Recipe.objects.bulk_create(recipes)
+                ids = dict(Recipe.objects.filter(
+                    short_code__in=plans
+                ).values_list('short_code', 'pk'))
+                AmountIngredients.objects.bulk_create(
+                    AmountIngredients(
+                        recipe_id=ids[code], ingredient_id=ingredient_id,
+                        amount=self.rng.randint(1, 500)
+                    )
+                    for code, (ingredients, _) in plans.items()
+                    for ingredient_id in ingredients
+                )
+                Recipe.tags.through.objects.bulk_create(
+                    Recipe.tags.through(recipe_id=ids[code], tag_id=tag_id)
+                    for code, (_, tags) in plans.items()
+                    for tag_id in tags
+                )
+                created += len(recipes)
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'Рецепты: {created}/{count} '
+                    f'({created / elapsed:.0f} строк/с)'
+                )
+
+    def create_relations(self, model, user_ids, population, weights, mean,
+                         field, label, exclude_self=False):
+        self.bulk_create(model, (
+            model(user_id=user_id, **{field: target})
+            for user_id in user_ids
+            for target in self.sample(
+                population, weights, self.skewed_count(mean),
+                exclude=user_id if exclude_self else None
+            )
+        ), label)
+
+    def handle(self, *args, **options):
+        if options['users'] < 2 or options['recipes'] < 1:
+            raise CommandError('Нужно не меньше 2 пользователей и 1 рецепта.')
+        if not Ingredient.objects.exists():
+            raise CommandError(
+                'Нет ингредиентов: сначала выполните load_ingredients.'
+            )
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(
+                f'Пользователи с префиксом {prefix} уже есть, '
+                f'укажите другой --prefix.'
+            )
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=name, slug=slug) for name, slug in DEFAULT_TAGS
+            )
+
+        user_ids = self.create_users(options['users'], prefix)
+        authors = list(user_ids)
+        self.rng.shuffle(authors)
+        self.create_recipes(options['recipes'], authors, options)
+
+        recipe_ids = list(
+            Recipe.objects.filter(author__username__startswith=f'{prefix}_')
+            .order_by('pk').values_list('pk', flat=True)
+        )
+        self.rng.shuffle(recipe_ids)
+        recipe_weights = zipf_cum_weights(len(recipe_ids), options['skew'])
+        author_weights = zipf_cum_weights(len(authors), options['skew'])
+        self.create_relations(
+            Favorited, user_ids, recipe_ids, recipe_weights,
+            options['favorites_per_user'], 'recipe_id', 'Избранное'
+        )
+        self.create_relations(
+            ShoppingCart, user_ids, recipe_ids, recipe_weights,
+            options['cart_per_user'], 'recipe_id', 'Корзины'
+        )
+        self.create_relations(
+            Subscriptions, user_ids, authors, author_weights,
+            options['subscriptions_per_user'], 'author_id', 'Подписки',
+            exclude_self=True
+        )
+
+        # bulk_create не вызывает сигналы: пересчитываем производные данные
+        call_command('reconcile_recipe_counters', stdout=io.StringIO())
+        call_command('rebuild_shopping_cart_totals', stdout=io.StringIO())
+        call_command('rebuild_search_vectors', stdout=io.StringIO())
+        invalidate_tags(RECIPES_TAG)
+        self.stdout.write(self.style.SUCCESS('Данные сгенерированы.'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from foodgram.images import process_recipe_image
+from foodgram.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Создаёт уменьшенные копии изображений рецептов, у которых их '
+            'нет: задачи фонового пула теряются при перезапуске процесса.')
+
+    def handle(self, *args, **options):
+        recipes = list(
+            Recipe.objects.filter(image_variants={}).exclude(image='')
+            .order_by('pk').values_list('pk', 'image')
+        )
+        processed = 0
+        for number, (recipe_id, name) in enumerate(recipes, 1):
+            processed += process_recipe_image(recipe_id, name)
+            self.stdout.write(f'Обработано рецептов: {number}/{len(recipes)}')
+        failed = len(recipes) - processed
+        if failed:
+            self.stdout.write(self.style.WARNING(
+                f'Не обработано: {failed}, подробности в логе.'
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f'Уменьшенные копии созданы: {processed}'
+        ))
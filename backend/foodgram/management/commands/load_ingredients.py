@@ -0,0 +1,14 @@
+from django.conf import settings
+
+from api.reference_data import ingredient_reference
+from foodgram.management.loader import BaseLoadCommand
+from foodgram.models import Ingredient
+
+
+class Command(BaseLoadCommand):
+    help = 'Загружает ингредиенты из CSV или JSON (по умолчанию data/).'
+
+    model = Ingredient
+    fields = ('name', 'measurement_unit')
+    default_path = str(settings.BASE_DIR.parent / 'data' / 'ingredients.csv')
+    reference = ingredient_reference
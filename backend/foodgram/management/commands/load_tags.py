@@ -0,0 +1,11 @@
+from api.reference_data import tag_reference
+from foodgram.management.loader import BaseLoadCommand
+from foodgram.models import Tag
+
+
+class Command(BaseLoadCommand):
+    help = 'Загружает теги (name, slug) из CSV или JSON.'
+
+    model = Tag
+    fields = ('name', 'slug')
+    reference = tag_reference
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Max
+
+from constants import LOAD_BATCH_SIZE
+from foodgram.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает поисковые векторы рецептов (PostgreSQL), '
+            'например после bulk_create или загрузки дампа.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=LOAD_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write('Поисковый вектор хранится только в PostgreSQL.')
+            return
+        batch_size = options['batch_size']
+        last_id = Recipe.objects.aggregate(last_id=Max('pk'))['last_id'] or 0
+        updated = 0
+        for start in range(0, last_id, batch_size):
+            updated += Recipe.objects.filter(
+                pk__gt=start, pk__lte=start + batch_size
+            ).update_search_vector()
+            self.stdout.write(f'Обновлено рецептов: {updated}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Поисковые векторы пересчитаны: {updated}'
+        ))
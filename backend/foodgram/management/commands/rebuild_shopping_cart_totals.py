@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from foodgram.models import ShoppingCartIngredient
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает и проверяет итоги списков покупок пользователей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только сверить итоги с корзинами, ничего не меняя.'
+        )
+
+    def find_mismatches(self):
+        expected = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount
+            in ShoppingCartIngredient.objects.expected_totals().iterator()
+        }
+        mismatches = []
+        for user_id, ingredient_id, amount in (
+            ShoppingCartIngredient.objects
+            .values_list('user_id', 'ingredient_id', 'amount')
+            .iterator()
+        ):
+            expected_amount = expected.pop((user_id, ingredient_id), None)
+            if expected_amount != amount:
+                mismatches.append(
+                    (user_id, ingredient_id, amount, expected_amount)
+                )
+        mismatches.extend(
+            (user_id, ingredient_id, None, amount)
+            for (user_id, ingredient_id), amount in expected.items()
+        )
+        return mismatches
+
+    def handle(self, *args, **options):
+        if not options['verify']:
+            with transaction.atomic():
+                ShoppingCartIngredient.objects.rebuild()
+            self.stdout.write('Итоги списков покупок пересобраны.')
+
+        mismatches = self.find_mismatches()
+        for user_id, ingredient_id, amount, expected in mismatches:
+            self.stdout.write(
+                f'user={user_id} ingredient={ingredient_id}: '
+                f'{amount} вместо {expected}'
+            )
+        if mismatches:
+            raise CommandError(f'Расхождений: {len(mismatches)}')
+        self.stdout.write(self.style.SUCCESS('Итоги совпадают с корзинами.'))
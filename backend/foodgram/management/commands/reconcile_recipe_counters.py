@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from foodgram.models import Favorited, Recipe, ShoppingCart
+
+
+def count_subquery(model):
+    return Coalesce(
+        Subquery(
+            model.objects
+            .filter(recipe=OuterRef('pk'))
+            .order_by()
+            .values('recipe')
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        Value(0)
+    )
+
+
+class Command(BaseCommand):
+    help = ('Сверяет счётчики favorites_count и in_cart_count рецептов '
+            'с таблицами избранного и корзин и исправляет расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только показать расхождения, ничего не меняя.'
+        )
+
+    def handle(self, *args, **options):
+        mismatched = (
+            Recipe.objects
+            .annotate(
+                actual_favorites=count_subquery(Favorited),
+                actual_in_cart=count_subquery(ShoppingCart)
+            )
+            .exclude(
+                favorites_count=F('actual_favorites'),
+                in_cart_count=F('actual_in_cart')
+            )
+        )
+        total = 0
+        for recipe in mismatched.iterator():
+            total += 1
+            self.stdout.write(
+                f'recipe={recipe.pk}: '
+                f'favorites {recipe.favorites_count} -> '
+                f'{recipe.actual_favorites}, '
+                f'in_cart {recipe.in_cart_count} -> {recipe.actual_in_cart}'
+            )
+        if not total:
+            self.stdout.write(self.style.SUCCESS('Счётчики совпадают.'))
+            return
+        if options['verify']:
+            self.stdout.write(f'Расхождений: {total}')
+            return
+        Recipe.objects.filter(pk__in=mismatched.values('pk')).update(
+            favorites_count=count_subquery(Favorited),
+            in_cart_count=count_subquery(ShoppingCart)
+        )
+        self.stdout.write(self.style.SUCCESS(f'Исправлено рецептов: {total}'))
@@ -0,0 +1,192 @@
+import csv
+import io
+import json
+import os
+import re
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.response_cache import REFERENCE_TAG, invalidate_tags
+from constants import LOAD_BATCH_SIZE, LOAD_READ_CHUNK_SIZE
+
+SEPARATORS = re.compile(r'[\s,]*')
+
+
+def iter_json_array(file, chunk_size=LOAD_READ_CHUNK_SIZE):
+    """Объекты JSON-массива по одному, без чтения файла целиком."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError('Ожидался JSON-массив.')
+    position = 1
+    eof = False
+    while True:
+        position = SEPARATORS.match(buffer, position).end()
+        if buffer.startswith(']', position):
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise ValueError('Незавершённый JSON-массив.')
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield item
+
+
+class BaseLoadCommand(BaseCommand):
+    """Потоковая загрузка справочника из CSV или JSON.
+
+    Строки читаются и дедуплицируются по ходу чтения и пишутся пачками:
+    в PostgreSQL через COPY во временную таблицу и INSERT ... ON CONFLICT
+    DO NOTHING, в остальных СУБД через bulk_create(ignore_conflicts=True).
+    Уже существующие записи отсекает уникальное ограничение модели,
+    поэтому повторная загрузка ничего не дублирует.
+    """
+
+    model = None
+    fields = ()
+    default_path = None
+    reference = None
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=self.default_path,
+            help='Файл .csv (без заголовка или с заголовком '
+                 f'{",".join(self.fields)}) или .json (массив объектов).'
+        )
+        parser.add_argument(
+            '--format',
+            choices=('csv', 'json'),
+            help='Формат файла; по умолчанию определяется по расширению.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=LOAD_BATCH_SIZE
+        )
+
+    def read_rows(self, file, file_format):
+        if file_format == 'json':
+            for item in iter_json_array(file):
+                if not isinstance(item, dict):
+                    # Пустая строка не пройдёт проверку длины и попадёт
+                    # в пропущенные, как и некорректная строка CSV
+                    yield ()
+                    continue
+                yield [item.get(field) for field in self.fields]
+            return
+        for row in csv.reader(file):
+            if row == list(self.fields):
+                continue
+            yield row
+
+    def clean_rows(self, rows):
+        seen = set()
+        for row in rows:
+            self.read += 1
+            if len(row) != len(self.fields):
+                self.skipped += 1
+                continue
+            row = tuple(str(value or '').strip() for value in row)
+            if not all(row):
+                self.skipped += 1
+                continue
+            if row in seen:
+                self.duplicates += 1
+                continue
+            seen.add(row)
+            yield row
+
+    def write_batch(self, batch):
+        if connection.vendor == 'postgresql':
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(batch)
+            buffer.seek(0)
+            with connection.cursor() as cursor:
+                cursor.copy_expert(
+                    f'COPY load_buffer ({", ".join(self.fields)}) '
+                    f'FROM STDIN WITH (FORMAT csv)',
+                    buffer
+                )
+        else:
+            self.model.objects.bulk_create(
+                (self.model(**dict(zip(self.fields, row))) for row in batch),
+                ignore_conflicts=True
+            )
+
+    def prepare(self):
+        if connection.vendor != 'postgresql':
+            return
+        columns = ', '.join(f'{field} text' for field in self.fields)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMP TABLE load_buffer ({columns}) ON COMMIT DROP'
+            )
+
+    def finish(self):
+        if connection.vendor != 'postgresql':
+            return
+        columns = ', '.join(self.fields)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {self.model._meta.db_table} ({columns}) '
+                f'SELECT {columns} FROM load_buffer '
+                f'ON CONFLICT DO NOTHING'
+            )
+
+    def report(self, started):
+        elapsed = time.monotonic() - started
+        rate = self.read / elapsed if elapsed else 0
+        self.stdout.write(
+            f'Прочитано {self.read} строк за {elapsed:.1f} с '
+            f'({rate:.0f} строк/с)'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not path:
+            raise CommandError('Укажите путь к файлу.')
+        file_format = options['format'] or os.path.splitext(path)[1][1:]
+        if file_format not in ('csv', 'json'):
+            raise CommandError('Укажите файл .csv или .json либо --format.')
+        batch_size = options['batch_size']
+        self.read = self.skipped = self.duplicates = 0
+        before = self.model.objects.count()
+        started = time.monotonic()
+        try:
+            with open(path, encoding='utf-8', newline='') as file, \
+                    transaction.atomic():
+                self.prepare()
+                batch = []
+                for row in self.clean_rows(self.read_rows(file, file_format)):
+                    batch.append(row)
+                    if len(batch) >= batch_size:
+                        self.write_batch(batch)
+                        self.report(started)
+                        batch = []
+                if batch:
+                    self.write_batch(batch)
+                self.finish()
+        except OSError as error:
+            raise CommandError(f'Не удалось прочитать {path}: {error}')
+        except ValueError as error:
+            raise CommandError(f'Некорректный файл {path}: {error}')
+        # bulk_create и COPY не вызывают сигналы: сбрасываем кеши сами
+        self.reference.invalidate()
+        invalidate_tags(REFERENCE_TAG)
+        self.report(started)
+        created = self.model.objects.count() - before
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено: {created}, уже были в базе: '
+            f'{self.read - self.skipped - self.duplicates - created}, '
+            f'повторов в файле: {self.duplicates}, '
+            f'пропущено некорректных: {self.skipped}'
+        ))
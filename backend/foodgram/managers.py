@@ -0,0 +1,132 @@
+from datetime import datetime, timezone
+
+from django.apps import apps
+from django.contrib.postgres.search import SearchVector
+from django.db import connection, models
+from django.db.models import F, Value, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, RowNumber
+
+from constants import SEARCH_CONFIG
+
+PUB_DATE_FALLBACK = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def pub_date_key():
+    """Дата публикации без NULL: рецепты без даты считаются самыми старыми."""
+    return Coalesce(
+        'pub_date',
+        Value(PUB_DATE_FALLBACK, output_field=models.DateTimeField())
+    )
+
+
+class RecipeQuerySet(models.QuerySet):
+
+    def with_pub_key(self):
+        """Аннотация pub_key для keyset-пагинации по дате публикации."""
+        return self.annotate(pub_key=pub_date_key())
+
+    def update_search_vector(self):
+        """Пересчитать поисковый вектор: название весом A, описание B.
+
+        Вектор хранится только в PostgreSQL; в других СУБД поиск идёт
+        по icontains и вектор не нужен.
+        """
+        if connection.vendor != 'postgresql':
+            return 0
+        return self.update(search_vector=(
+            SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+        ))
+
+    def latest_per_author(self, author_ids, limit=None):
+        """Последние limit рецептов каждого автора одним запросом.
+
+        Номер рецепта внутри автора считается оконной функцией
+        ROW_NUMBER() OVER (PARTITION BY author_id).
+        """
+        recipes = self.filter(author_id__in=author_ids)
+        if limit is None:
+            return recipes
+        ranked = recipes.annotate(
+            row_number=Window(
+                RowNumber(),
+                partition_by=[F('author_id')],
+                order_by=[F('pub_date').desc(), F('pk').desc()]
+            )
+        ).order_by().values('pk', 'row_number')
+        sql, params = ranked.query.sql_with_params()
+        return self.filter(pk__in=RawSQL(
+            f'SELECT ranked.id FROM ({sql}) ranked '
+            f'WHERE ranked.row_number <= %s',
+            (*params, limit)
+        ))
+
+
+class ShoppingCartIngredientManager(models.Manager):
+    """Менеджер итогов списка покупок.
+
+    Итоги по ингредиентам хранятся для каждого пользователя и меняются
+    дельтами при добавлении и удалении рецептов из корзины.
+    """
+
+    def apply_recipe(self, recipe_id, sign, user_id=None):
+        """Прибавить (sign=1) или вычесть (sign=-1) ингредиенты рецепта.
+
+        Без user_id изменение применяется ко всем корзинам с этим рецептом.
+        """
+        amount_ingredients = apps.get_model('foodgram', 'AmountIngredients')
+        shopping_cart = apps.get_model('foodgram', 'ShoppingCart')
+        table = self.model._meta.db_table
+        user_filter = ''
+        params = [sign, recipe_id]
+        if user_id is not None:
+            user_filter = 'AND cart.user_id = %s'
+            params.append(user_id)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, ingredient_id, amount) '
+                f'SELECT cart.user_id, item.ingredient_id, item.amount * %s '
+                f'FROM {amount_ingredients._meta.db_table} item '
+                f'JOIN {shopping_cart._meta.db_table} cart '
+                f'ON cart.recipe_id = item.recipe_id '
+                f'WHERE item.recipe_id = %s {user_filter} '
+                f'ON CONFLICT (user_id, ingredient_id) DO UPDATE '
+                f'SET amount = {table}.amount + EXCLUDED.amount',
+                params
+            )
+        totals = self.filter(amount__lte=0)
+        if user_id is not None:
+            totals = totals.filter(user_id=user_id)
+        else:
+            totals = totals.filter(user__shopping_cart__recipe_id=recipe_id)
+        totals.delete()
+
+    def add_recipe(self, recipe_id, user_id=None):
+        self.apply_recipe(recipe_id, 1, user_id)
+
+    def remove_recipe(self, recipe_id, user_id=None):
+        self.apply_recipe(recipe_id, -1, user_id)
+
+    def expected_totals(self):
+        """Итоги, посчитанные заново по корзинам и ингредиентам рецептов."""
+        amount_ingredients = apps.get_model('foodgram', 'AmountIngredients')
+        return (
+            amount_ingredients.objects
+            .filter(recipe__in_shopping_cart__isnull=False)
+            .values_list('recipe__in_shopping_cart__user_id', 'ingredient_id')
+            .annotate(total_amount=models.Sum('amount'))
+            .order_by()
+        )
+
+    def rebuild(self):
+        """Пересобрать таблицу итогов целиком."""
+        self.all().delete()
+        self.bulk_create(
+            (
+                self.model(user_id=user_id, ingredient_id=ingredient_id,
+                           amount=amount)
+                for user_id, ingredient_id, amount in self.expected_totals()
+            ),
+            batch_size=1000
+        )
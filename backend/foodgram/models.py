@@ -1,12 +1,17 @@
-import secrets
-
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.urls import reverse
 
 from constants import (MAX_AMOUNT, MAX_COOKING_TIME, MAX_INGREDIENT_NAME,
                        MAX_MEASUREMENT_UNIT, MAX_RECIPE, MAX_SHORT_CODE,
-                       MAX_TAG, MIN_AMOUNT, MIN_COOKING_TIME)
+                       MAX_TAG, MIN_AMOUNT, MIN_COOKING_TIME,
+                       SHORT_CODE_ATTEMPTS)
+from foodgram.managers import (RecipeQuerySet, ShoppingCartIngredientManager,
+                               pub_date_key)
+from foodgram.short_links import generate_short_code
 
 User = get_user_model()
 
@@ -49,6 +54,12 @@ class Ingredient(models.Model):
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ['name']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient'
+            )
+        ]
 
     def __str__(self):
         return f'{self.name} ({self.measurement_unit})'
@@ -72,6 +83,12 @@ class Recipe(models.Model):
         verbose_name='Изображение',
         help_text='Загрузите изображение рецепта'
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии изображения'
+    )
     text = models.TextField(
         verbose_name='Описание рецепта',
         help_text='Введите описание рецепта'
@@ -102,19 +119,75 @@ class Recipe(models.Model):
         null=True,
         verbose_name='Дата публикации'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        null=True,
+        verbose_name='Дата изменения'
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном'
+    )
+    in_cart_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В списках покупок'
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор'
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     def save(self, *args, **kwargs):
-        if not self.short_code:
-            self.short_code = secrets.token_urlsafe(4)[:6]
-        super().save(*args, **kwargs)
+        if self.short_code:
+            return super().save(*args, **kwargs)
+        for attempt in range(SHORT_CODE_ATTEMPTS):
+            self.short_code = generate_short_code()
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                taken = Recipe.objects.filter(
+                    short_code=self.short_code
+                ).exists()
+                self.short_code = ''
+                if not taken or attempt == SHORT_CODE_ATTEMPTS - 1:
+                    raise
 
     def get_short_url(self):
-        return f'http://localhost:7000/recipes/{self.id}'
+        return reverse('short_link', kwargs={'code': self.short_code})
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                pub_date_key().desc(),
+                models.F('id').desc(),
+                name='recipe_pub_key_id_idx'
+            ),
+            models.Index(
+                fields=['-favorites_count', '-pub_date'],
+                name='recipe_favorites_count_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx'
+            ),
+            GinIndex(
+                fields=['search_vector'],
+                name='recipe_search_vector_idx'
+            )
+        ]
 
     def __str__(self):
         return self.name
@@ -146,6 +219,12 @@ class AmountIngredients(models.Model):
         verbose_name = 'Количество ингредиента'
         verbose_name_plural = 'Количество ингредиентов'
         ordering = ['ingredient__name']
+        indexes = [
+            models.Index(
+                fields=['ingredient', 'recipe'],
+                name='amount_ingredient_recipe_idx'
+            )
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['recipe', 'ingredient'],
@@ -226,6 +305,39 @@ class ShoppingCart(models.Model):
         return f'{self.user.username} - Подписки'
 
 
+class ShoppingCartIngredient(models.Model):
+    """Итог по ингредиенту в списке покупок пользователя."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_ingredients',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_totals',
+        verbose_name='Ингредиент'
+    )
+    amount = models.IntegerField(verbose_name='Количество')
+
+    objects = ShoppingCartIngredientManager()
+
+    class Meta:
+        verbose_name = 'Итог списка покупок'
+        verbose_name_plural = 'Итоги списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_cart_ingredient'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user.username} - {self.ingredient.name}'
+
+
 class Subscriptions(models.Model):
     user = models.ForeignKey(
         User,
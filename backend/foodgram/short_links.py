@@ -0,0 +1,76 @@
+import secrets
+import string
+import threading
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+from constants import (SHORT_CODE_LENGTH, SHORT_LINK_CACHE_TIMEOUT,
+                       SHORT_LINK_LRU_SIZE)
+
+ALPHABET = string.digits + string.ascii_letters
+
+
+def generate_short_code():
+    return ''.join(
+        secrets.choice(ALPHABET) for _ in range(SHORT_CODE_LENGTH)
+    )
+
+
+class LRUCache:
+    """Небольшой потокобезопасный LRU-кеш в памяти процесса."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.items:
+                return None
+            self.items.move_to_end(key)
+            return self.items[key]
+
+    def set(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            if len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.items.pop(key, None)
+
+
+_local = LRUCache(SHORT_LINK_LRU_SIZE)
+
+
+def cache_key(code):
+    return f'short_link:{code}'
+
+
+def resolve_short_code(code):
+    """id рецепта по короткому коду: LRU процесса, общий кеш, затем БД."""
+    from foodgram.models import Recipe
+
+    recipe_id = _local.get(code)
+    if recipe_id is not None:
+        return recipe_id
+    recipe_id = cache.get(cache_key(code))
+    if recipe_id is None:
+        recipe_id = (
+            Recipe.objects.filter(short_code=code)
+            .values_list('pk', flat=True).first()
+        )
+        if recipe_id is None:
+            return None
+        cache.set(cache_key(code), recipe_id, SHORT_LINK_CACHE_TIMEOUT)
+    _local.set(code, recipe_id)
+    return recipe_id
+
+
+def forget_short_code(code):
+    _local.delete(code)
+    cache.delete(cache_key(code))
@@ -0,0 +1,53 @@
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from foodgram.models import (Favorited, Recipe, ShoppingCart,
+                             ShoppingCartIngredient)
+
+
+SEARCH_FIELDS = {'name', 'text'}
+
+
+def change_recipe_counter(recipe_id, field, delta):
+    # Не уходим ниже нуля, даже если счётчик рассинхронизирован
+    Recipe.objects.filter(pk=recipe_id).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search_vector(sender, instance, update_fields, **kwargs):
+    if update_fields is not None and not SEARCH_FIELDS & set(update_fields):
+        return
+    Recipe.objects.filter(pk=instance.pk).update_search_vector()
+
+
+@receiver(post_save, sender=Favorited)
+def increment_favorites_count(sender, instance, created, **kwargs):
+    if created:
+        change_recipe_counter(instance.recipe_id, 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=Favorited)
+def decrement_favorites_count(sender, instance, **kwargs):
+    change_recipe_counter(instance.recipe_id, 'favorites_count', -1)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_cart(sender, instance, created, **kwargs):
+    if created:
+        ShoppingCartIngredient.objects.add_recipe(
+            instance.recipe_id, instance.user_id
+        )
+        change_recipe_counter(instance.recipe_id, 'in_cart_count', 1)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_cart(sender, instance, **kwargs):
+    # pre_delete: при каскадном удалении рецепта его ингредиенты ещё на месте
+    ShoppingCartIngredient.objects.remove_recipe(
+        instance.recipe_id, instance.user_id
+    )
+    change_recipe_counter(instance.recipe_id, 'in_cart_count', -1)
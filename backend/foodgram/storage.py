@@ -0,0 +1,65 @@
+import hashlib
+import os
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, именующее файлы по SHA-256 содержимого.
+
+    Одинаковые загрузки в один каталог дают один файл. Новый файл пишется
+    под временным именем и публикуется жёсткой ссылкой: если такой файл
+    уже создан параллельной загрузкой, ссылка не создаётся и временный
+    файл удаляется. Содержимое файла по имени никогда не меняется, поэтому
+    его можно отдавать с бессрочным кешированием.
+    """
+
+    hash_chunk_size = 64 * 1024
+
+    def get_content_hash(self, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in iter(lambda: content.read(self.hash_chunk_size), b''):
+            digest.update(chunk)
+        content.seek(0)
+        return digest.hexdigest()
+
+    def get_content_name(self, name, content):
+        directory, filename = os.path.split(name)
+        ext = os.path.splitext(filename)[1].lower()
+        return os.path.join(
+            directory, self.get_content_hash(content) + ext
+        )
+
+    def get_available_name(self, name, max_length=None):
+        # Уникальность имени обеспечивает хеш, суффиксы не нужны
+        return name
+
+    def touch(self, name):
+        """Обновить mtime существующего файла.
+
+        Повторно использованный файл получает тот же льготный срок
+        у сборщика мусора, что и только что записанный.
+        """
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _save(self, name, content):
+        name = self.get_content_name(name, content)
+        if self.touch(name):
+            return name
+        directory, filename = os.path.split(name)
+        temp_name = super()._save(
+            os.path.join(directory, f'.{uuid.uuid4().hex}.tmp'), content
+        )
+        try:
+            os.link(self.path(temp_name), self.path(name))
+        except FileExistsError:
+            self.touch(name)
+        finally:
+            os.remove(self.path(temp_name))
+        return name
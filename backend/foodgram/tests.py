@@ -0,0 +1,533 @@
+import base64
+import io
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from api.reference_data import tag_reference
+from api.serializers import RecipeSerializer
+from api.users_serializers import Base64ImageField
+from constants import VERSIONS_CACHE
+
+from foodgram.admin import RecipeAdmin
+from foodgram.images import build_variants
+from foodgram.models import (AmountIngredients, Ingredient, Recipe,
+                             ShoppingCart, ShoppingCartIngredient,
+                             Subscriptions, Tag)
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+# Бюджеты запросов считают только обращения к данным, не к кешу
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'versions': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'versions',
+        'TIMEOUT': None,
+    },
+}
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+
+
+def tearDownModule():
+    shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+
+def create_user(username):
+    return User.objects.create_user(
+        username, f'{username}@example.com', 'Имя', 'Фамилия', 'password123'
+    )
+
+
+def create_recipe(author, name='Рецепт', tags=(), amounts=None):
+    """Рецепт с картинкой, тегами и ингредиентами {ингредиент: количество}."""
+    recipe = Recipe.objects.create(
+        author=author,
+        name=name,
+        text='Описание',
+        cooking_time=10,
+        image=SimpleUploadedFile('recipe.gif', SMALL_GIF,
+                                 content_type='image/gif')
+    )
+    if tags:
+        recipe.tags.set(tags)
+    if amounts:
+        AmountIngredients.objects.bulk_create(
+            AmountIngredients(recipe=recipe, ingredient=ingredient,
+                              amount=amount)
+            for ingredient, amount in amounts.items()
+        )
+    return recipe
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, CACHES=LOCMEM_CACHES)
+class RecipeListQueriesTest(TestCase):
+    """Число запросов к списку рецептов не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.reader = create_user('reader')
+        Subscriptions.objects.create(user=cls.reader, author=cls.author)
+        cls.tags = [
+            Tag.objects.create(name=f'Тег {i}', slug=f'tag-{i}')
+            for i in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {i}',
+                                      measurement_unit='г')
+            for i in range(5)
+        ]
+
+    def create_recipes(self, count):
+        for i in range(count):
+            create_recipe(
+                self.author, f'Рецепт {i}', self.tags,
+                dict.fromkeys(self.ingredients, 1)
+            )
+
+    def assert_list_queries(self, client, expected):
+        cache.clear()
+        with self.assertNumQueries(expected):
+            response = client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_anonymous_list_has_fixed_query_budget(self):
+        client = APIClient()
+        self.create_recipes(2)
+        self.assert_list_queries(client, 4)
+        self.create_recipes(8)
+        results = self.assert_list_queries(client, 4)
+        self.assertEqual(len(results), 6)
+        self.assertEqual(len(results[0]['ingredients']), 5)
+
+    def test_authenticated_list_has_fixed_query_budget(self):
+        client = APIClient()
+        client.force_authenticate(self.reader)
+        self.create_recipes(2)
+        self.assert_list_queries(client, 4)
+        self.create_recipes(8)
+        results = self.assert_list_queries(client, 4)
+        self.assertTrue(results[0]['author']['is_subscribed'])
+        self.assertFalse(results[0]['is_favorited'])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, CACHES=LOCMEM_CACHES)
+class SubscriptionQueriesTest(TestCase):
+    """Подписки и список пользователей не делают запросов на автора."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = create_user('reader')
+        cls.authors = [create_user(f'author{i}') for i in range(4)]
+        for author in cls.authors[:3]:
+            Subscriptions.objects.create(user=cls.reader, author=author)
+            for i in range(3):
+                create_recipe(author, f'Рецепт {i}')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def test_subscriptions_limit_recipes_per_author(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                '/api/users/subscriptions/?recipes_limit=2'
+            )
+        results = response.json()['results']
+        self.assertEqual(len(results), 3)
+        for author in results:
+            self.assertTrue(author['is_subscribed'])
+            self.assertEqual(author['recipes_count'], 3)
+            self.assertEqual(len(author['recipes']), 2)
+
+    def test_users_list_resolves_subscriptions_at_once(self):
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/users/')
+        subscribed = {
+            user['username']: user['is_subscribed']
+            for user in response.json()['results']
+        }
+        self.assertTrue(subscribed['author0'])
+        self.assertFalse(subscribed['author3'])
+        self.assertFalse(subscribed['reader'])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ShoppingCartTotalsTest(TestCase):
+    """Итоги списка покупок меняются дельтами вместе с корзиной."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.buyer = create_user('buyer')
+        cls.tag = Tag.objects.create(name='Тег', slug='tag')
+        cls.flour, cls.sugar, cls.milk = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('мука', 'сахар', 'молоко')
+        )
+
+    def create_recipe(self, amounts):
+        return create_recipe(self.author, tags=[self.tag], amounts=amounts)
+
+    def totals(self):
+        return dict(
+            ShoppingCartIngredient.objects.filter(user=self.buyer)
+            .values_list('ingredient__name', 'amount')
+        )
+
+    def test_add_and_remove_recipes(self):
+        pancakes = self.create_recipe({self.flour: 200, self.milk: 300})
+        cake = self.create_recipe({self.flour: 100, self.sugar: 50})
+        ShoppingCart.objects.create(user=self.buyer, recipe=pancakes)
+        ShoppingCart.objects.create(user=self.buyer, recipe=cake)
+        self.assertEqual(
+            self.totals(), {'мука': 300, 'молоко': 300, 'сахар': 50}
+        )
+        ShoppingCart.objects.get(user=self.buyer, recipe=pancakes).delete()
+        self.assertEqual(self.totals(), {'мука': 100, 'сахар': 50})
+
+    def test_counter_never_goes_negative(self):
+        recipe = self.create_recipe({self.flour: 100})
+        ShoppingCart.objects.create(user=self.buyer, recipe=recipe)
+        # Счётчик, не заполненный до появления сигналов
+        Recipe.objects.filter(pk=recipe.pk).update(in_cart_count=0)
+        ShoppingCart.objects.get(user=self.buyer, recipe=recipe).delete()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.in_cart_count, 0)
+
+    def test_recipe_update_changes_totals(self):
+        recipe = self.create_recipe({self.flour: 200, self.milk: 300})
+        ShoppingCart.objects.create(user=self.buyer, recipe=recipe)
+        client = APIClient()
+        client.force_authenticate(self.author)
+        response = client.patch(f'/api/recipes/{recipe.pk}/', {
+            'tags': [self.tag.pk],
+            'ingredients': [
+                {'id': self.flour.pk, 'amount': 250},
+                {'id': self.sugar.pk, 'amount': 10},
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.totals(), {'мука': 250, 'сахар': 10})
+
+    def test_admin_inline_save_changes_totals(self):
+        recipe = self.create_recipe({self.flour: 200, self.milk: 300})
+        ShoppingCart.objects.create(user=self.buyer, recipe=recipe)
+
+        class InlineFormSet:
+            # Инлайн сохраняет строки по одной, как делает админка
+            def save(formset):
+                AmountIngredients.objects.filter(
+                    recipe=recipe, ingredient=self.flour
+                ).update(amount=250)
+                AmountIngredients.objects.filter(
+                    recipe=recipe, ingredient=self.milk
+                ).delete()
+
+        form = mock.Mock(instance=recipe)
+        RecipeAdmin(Recipe, admin.site).save_related(
+            None, form, [InlineFormSet()], change=True
+        )
+        self.assertEqual(self.totals(), {'мука': 250})
+
+    def test_recipe_delete_cascades_to_totals(self):
+        recipe = self.create_recipe({self.flour: 200})
+        other = self.create_recipe({self.flour: 100})
+        ShoppingCart.objects.create(user=self.buyer, recipe=recipe)
+        ShoppingCart.objects.create(user=self.buyer, recipe=other)
+        recipe.delete()
+        self.assertEqual(self.totals(), {'мука': 100})
+        other.delete()
+        self.assertEqual(self.totals(), {})
+
+
+class ReferenceDataTest(TestCase):
+    """Версия справочника меняется только после коммита."""
+
+    def test_snapshot_rebuilt_after_commit(self):
+        cache.clear()
+        version = tag_reference.get_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name='Новый', slug='new')
+            self.assertEqual(tag_reference.get_version(), version)
+        snapshot = tag_reference.get()
+        self.assertNotEqual(snapshot.version, version)
+        self.assertIn('new', [tag['slug'] for tag in snapshot.items])
+
+    @override_settings(CACHES={
+        **LOCMEM_CACHES,
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'small',
+            'OPTIONS': {'MAX_ENTRIES': 10},
+        },
+    })
+    def test_version_survives_culling(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            tag_reference.invalidate()
+        version = tag_reference.get_version()
+        cache.set_many({f'recipe_fragment:{number}': number
+                        for number in range(100)})
+        self.assertEqual(tag_reference.get_version(), version)
+
+    def test_lost_version_is_not_reused(self):
+        version = tag_reference.get_version()
+        caches[VERSIONS_CACHE].clear()
+        self.assertNotEqual(tag_reference.get_version(), version)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, CACHES=LOCMEM_CACHES)
+class RecipeCursorPaginationTest(TestCase):
+    """Keyset-пагинация: next/previous и совпадающие даты публикации."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        recipes = [create_recipe(cls.author, f'Рецепт {i}') for i in range(6)]
+        # Две пары рецептов с одинаковой датой: порядок решает id;
+        # рецепт без даты публикации идёт последним
+        base = timezone.now()
+        for recipe, minutes in zip(recipes, (0, 0, 1, 2, 2, None)):
+            Recipe.objects.filter(pk=recipe.pk).update(
+                pub_date=None if minutes is None
+                else base + timedelta(minutes=minutes)
+            )
+        cls.expected = [
+            recipe.pk for recipe in
+            Recipe.objects.filter(pub_date__isnull=False)
+            .order_by('-pub_date', '-pk')
+        ] + [recipes[-1].pk]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def get_page(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return [recipe['id'] for recipe in data['results']], data
+
+    def walk(self, url):
+        ids, data = self.get_page(url)
+        self.assertIsNone(data['previous'])
+        pages = [ids]
+        while data['next']:
+            ids, data = self.get_page(data['next'])
+            pages.append(ids)
+        return pages, data
+
+    def test_next_and_previous_links(self):
+        pages, data = self.walk('/api/recipes/?cursor=&limit=4')
+        self.assertEqual(sum(pages, []), self.expected)
+        self.assertEqual([len(page) for page in pages], [4, 2])
+        ids, data = self.get_page(data['previous'])
+        self.assertEqual(ids, pages[0])
+        self.assertIsNone(data['previous'])
+
+    def test_previous_links_across_equal_dates(self):
+        pages, data = self.walk('/api/recipes/?cursor=&limit=2')
+        self.assertEqual(sum(pages, []), self.expected)
+        for page in reversed(pages[:-1]):
+            ids, data = self.get_page(data['previous'])
+            self.assertEqual(ids, page)
+        self.assertIsNone(data['previous'])
+
+    def test_feed_reaches_recipe_without_date(self):
+        reader = create_user('reader')
+        Subscriptions.objects.create(user=reader, author=self.author)
+        self.client.force_authenticate(reader)
+        pages, _ = self.walk('/api/recipes/feed/?limit=4')
+        self.assertEqual(sum(pages, []), self.expected)
+
+    def test_cursor_rejects_explicit_ordering(self):
+        for query in ('ordering=-favorites_count', 'search=Рецепт',
+                      'ingredients=1'):
+            response = self.client.get(f'/api/recipes/?cursor=&{query}')
+            self.assertEqual(response.status_code, 400, query)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/recipes/?cursor=broken')
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, CACHES=LOCMEM_CACHES)
+class RecipeResponseCacheTest(TestCase):
+    """Закешированные ответы сбрасываются сигналами после коммита."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.breakfast = Tag.objects.create(name='Завтрак', slug='breakfast')
+        cls.lunch = Tag.objects.create(name='Обед', slug='lunch')
+        cls.flour, cls.milk = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('мука', 'молоко')
+        )
+        cls.recipe = create_recipe(
+            cls.author, 'Блины', [cls.breakfast], {cls.flour: 200}
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.detail_url = f'/api/recipes/{self.recipe.pk}/'
+        # Заполняем кеш списка и карточки
+        self.get_list()
+        self.get_detail()
+
+    def get_list(self):
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        return {recipe['id']: recipe for recipe in response.json()['results']}
+
+    def get_detail(self):
+        return self.client.get(self.detail_url).json()
+
+    def ingredients(self, recipe):
+        return {item['name']: item['amount'] for item in recipe['ingredients']}
+
+    def test_update_without_signals_stays_cached(self):
+        Recipe.objects.filter(pk=self.recipe.pk).update(name='Оладьи')
+        self.assertEqual(self.get_detail()['name'], 'Блины')
+
+    def test_recipe_edit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.name = 'Оладьи'
+            self.recipe.save()
+        self.assertEqual(self.get_detail()['name'], 'Оладьи')
+        self.assertEqual(self.get_list()[self.recipe.pk]['name'], 'Оладьи')
+
+    def test_ingredient_diff(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            item = AmountIngredients.objects.get(recipe=self.recipe)
+            item.amount = 250
+            item.save()
+            AmountIngredients.objects.create(
+                recipe=self.recipe, ingredient=self.milk, amount=300
+            )
+        expected = {'мука': 250, 'молоко': 300}
+        self.assertEqual(self.ingredients(self.get_detail()), expected)
+        self.assertEqual(
+            self.ingredients(self.get_list()[self.recipe.pk]), expected
+        )
+
+    def test_tag_m2m_change(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.tags.add(self.lunch)
+        self.assertEqual(
+            [tag['slug'] for tag in self.get_detail()['tags']],
+            ['breakfast', 'lunch']
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lunch.recipe_set.remove(self.recipe)
+        self.assertEqual(
+            [tag['slug'] for tag in
+             self.get_list()[self.recipe.pk]['tags']],
+            ['breakfast']
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.tags.add(self.lunch)
+        self.assertEqual(len(self.get_detail()['tags']), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lunch.recipe_set.clear()
+        self.assertEqual(
+            [tag['slug'] for tag in self.get_detail()['tags']],
+            ['breakfast']
+        )
+
+    def test_author_avatar_change(self):
+        self.assertIsNone(self.get_detail()['author']['avatar'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.avatar = SimpleUploadedFile(
+                'avatar.gif', SMALL_GIF, content_type='image/gif'
+            )
+            self.author.save()
+        self.assertTrue(self.get_detail()['author']['avatar'])
+        self.assertTrue(
+            self.get_list()[self.recipe.pk]['author']['avatar']
+        )
+
+    def test_recipe_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Recipe.objects.get(pk=self.recipe.pk).delete()
+        self.assertEqual(self.client.get(self.detail_url).status_code, 404)
+        self.assertNotIn(self.recipe.pk, self.get_list())
+
+
+class Base64ImageFieldTest(TestCase):
+    """Декодирование base64 кусками, в том числе с переносами строк."""
+
+    def decode(self, body):
+        with mock.patch('api.users_serializers.BASE64_CHUNK_SIZE', 7):
+            file = Base64ImageField().decode_base64(
+                'data:image/gif;base64,' + body
+            )
+        with file:
+            return file.read()
+
+    def test_line_breaks_are_ignored(self):
+        data = SMALL_GIF * 3
+        # encodebytes переносит строки каждые 76 символов
+        encoded = base64.encodebytes(data).decode()
+        self.assertIn('\n', encoded.strip())
+        self.assertEqual(self.decode(encoded), data)
+        self.assertEqual(self.decode(encoded.replace('\n', '\r\n')), data)
+
+    def test_truncated_body_is_rejected(self):
+        encoded = base64.b64encode(SMALL_GIF).decode()
+        with self.assertRaises(ValidationError):
+            self.decode(encoded[:-1])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageVariantsTest(TestCase):
+    """Уменьшенные копии не дублируют друг друга для узких исходников."""
+
+    def save_image(self, width):
+        buffer = io.BytesIO()
+        Image.new('RGB', (width, width), (200, 100, 50)).save(buffer, 'PNG')
+        return default_storage.save(
+            'recipes/images/source.png', ContentFile(buffer.getvalue())
+        )
+
+    def test_variants_are_not_upscaled(self):
+        widths = {
+            width: [variant['width'] for variant in
+                    build_variants(self.save_image(width)).values()]
+            for width in (20, 300, 2000)
+        }
+        self.assertEqual(widths, {
+            20: [20], 300: [160, 300], 2000: [160, 480, 1280]
+        })
+
+    def test_srcset_skips_duplicate_widths(self):
+        recipe = Recipe(image_variants={
+            variant: {'width': 20, 'webp': 'recipes/images/a.webp'}
+            for variant in ('thumbnail', 'card', 'full')
+        })
+        srcset = RecipeSerializer().get_image_srcset(recipe)
+        self.assertEqual(srcset['webp'].count('20w'), 1)
@@ -0,0 +1,12 @@
+from django.http import Http404
+from django.shortcuts import redirect
+
+from foodgram.short_links import resolve_short_code
+
+
+def short_link_redirect(request, code):
+    """Переход по короткой ссылке на страницу рецепта."""
+    recipe_id = resolve_short_code(code)
+    if recipe_id is None:
+        raise Http404('Короткая ссылка не найдена.')
+    return redirect(f'/recipes/{recipe_id}')
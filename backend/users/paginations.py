@@ -1,7 +1,9 @@
 from rest_framework.pagination import LimitOffsetPagination
 
+from api.pagination import CachedCountMixin
 
-class UsersPagination(LimitOffsetPagination):
+
+class UsersPagination(CachedCountMixin, LimitOffsetPagination):
 
     default_limit = 100
     max_limit = 1000